@@ -0,0 +1,71 @@
+"""
+Benchmark of the data file throughput of ProductObservational in text mode, in binary mode, in segmented mode and
+with preallocated records written in order or by several threads, and formatting in a pool of processes
+
+Run it from the root of the repository:
+    python benchmarks/bench_data_writer.py [number_of_records]
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from easypds4writer.product_observational import ProductObservational
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "easypds4writer", "test",
+                        "example_templates", "minimal_test_template.xml")
+
+
+def write_product(data_file_name, columns, block_size, preallocated=False, threads=0, formatters=0, **options):
+    product = ProductObservational(TEMPLATE, **options)
+    table = product.declare_table_character("benchmark")
+    table.declare_field("%-12s", "ASCII_String", "name", "none", "String field")
+    table.declare_field("%12.4f", "ASCII_Real", "value", "none", "Real field")
+    table.declare_field("%8d", "ASCII_Integer", "counter", "none", "Integer field")
+    number_of_records = len(columns[0])
+    product.new_product(data_file_name, preallocated_records=[number_of_records] if preallocated else None)
+    start = time.perf_counter()
+    if threads:
+        # Each thread writes whole blocks of rows at their place in the data file
+        def write_block(first):
+            table.write_records_at(first, zip(*[column[first:first + block_size] for column in columns]))
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(write_block, range(0, number_of_records, block_size)))
+    elif formatters:
+        # The whole table is given at once and split in chunks of block_size records formatted by the pool
+        with ProcessPoolExecutor(formatters) as executor:
+            table.add_records(columns, executor=executor, chunk_size=block_size)
+    else:
+        for first in range(0, number_of_records, block_size):
+            table.add_records([column[first:first + block_size] for column in columns])
+    product.close_product()
+    return time.perf_counter() - start
+
+
+def main():
+    number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    columns = [["name_%d" % (i % 1000) for i in range(number_of_records)],
+               [i * 0.25 for i in range(number_of_records)],
+               list(range(number_of_records))]
+    print("%-48s %12s %12s" % ("mode", "rows/s", "MB/s"))
+    with tempfile.TemporaryDirectory() as output_directory:
+        data_file_name = os.path.join(output_directory, "benchmark.tab")
+        for mode, options in (("text", {}), ("binary", {"binary": True}),
+                              ("binary, 16 MiB buffer", {"binary": True, "buffer_size": 16 * 1024 * 1024}),
+                              ("segmented", {"segmented_tables": True}),
+                              ("preallocated", {"preallocated": True}),
+                              ("preallocated, 4 threads", {"preallocated": True, "threads": 4}),
+                              ("binary, %d formatting processes" % (os.cpu_count() or 1),
+                               {"binary": True, "formatters": os.cpu_count() or 1})):
+            for block_size in (1000, 100000):
+                elapsed = write_product(data_file_name, columns, block_size, **options)
+                size = os.path.getsize(data_file_name)
+                print("%-48s %12.0f %12.1f" % ("%s, blocks of %d" % (mode, block_size), number_of_records / elapsed,
+                                               size / elapsed / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark of the label generation for tables with 10, 100 and 1000 fields
+
+It compares building the File_Area_Observational as ElementTree nodes, indenting the whole label recursively and
+serializing it (as labels were generated before the LabelWriter) with the current close_product.
+
+Run it from the root of the repository:
+    python benchmarks/bench_label_serializer.py [number_of_labels]
+"""
+import copy
+import os
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from easypds4writer.product_observational import ProductObservational
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "easypds4writer", "test",
+                        "example_templates", "example_template.xml")
+
+
+def recursive_indent(elem, level=0):
+    i = "\n" + level*"    "
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = i + "    "
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+        for elem in elem:
+            recursive_indent(elem, level+1)
+        if not elem.tail or not elem.tail.strip():
+            elem.tail = i
+    else:
+        if level and (not elem.tail or not elem.tail.strip()):
+            elem.tail = i
+
+
+def legacy_label(template_root, table):
+    """Label generated with ElementTree nodes for every element, as before the LabelWriter"""
+    label = copy.deepcopy(template_root)
+    file_area_observational = ET.SubElement(label, "File_Area_Observational")
+    table_character = ET.SubElement(file_area_observational, "Table_Character")
+    ET.SubElement(table_character, "offset").text = "0"
+    ET.SubElement(table_character, "records").text = "0"
+    record_character = ET.SubElement(table_character, "Record_Character")
+    field_location = 1
+    for field_number, field_character in enumerate(table._record_character.field_character, 1):
+        field_character_xml = ET.SubElement(record_character, "Field_Character")
+        ET.SubElement(field_character_xml, "name").text = field_character.name
+        ET.SubElement(field_character_xml, "field_number").text = str(field_number)
+        field_location_xml = ET.SubElement(field_character_xml, "field_location")
+        field_location_xml.text = str(field_location)
+        field_location_xml.set("unit", "byte")
+        ET.SubElement(field_character_xml, "data_type").text = field_character.data_type
+        field_length_xml = ET.SubElement(field_character_xml, "field_length")
+        field_length_xml.text = field_character.parsed_field_format.width
+        field_length_xml.set("unit", "byte")
+        ET.SubElement(field_character_xml, "field_format").text = field_character.field_format
+        ET.SubElement(field_character_xml, "unit").text = field_character.unit
+        ET.SubElement(field_character_xml, "description").text = field_character.description
+        field_location += int(field_character.parsed_field_format.width) + 2
+    recursive_indent(label, 0)
+    return ET.tostring(label, encoding="us-ascii")
+
+
+def new_product_type(number_of_fields):
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("benchmark")
+    for i in range(number_of_fields):
+        table.declare_field("%10.4f", "ASCII_Real", "field_%d" % i, "none", "Description of field %d" % i)
+    return product, table
+
+
+def main():
+    number_of_labels = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    template_root = ET.parse(TEMPLATE).getroot()
+    print("%-8s %-28s %20s" % ("fields", "method", "microseconds/label"))
+    with tempfile.TemporaryDirectory() as output_directory:
+        data_file_name = os.path.join(output_directory, "benchmark.tab")
+        for number_of_fields in (10, 100, 1000):
+            product, table = new_product_type(number_of_fields)
+
+            start = time.perf_counter()
+            for _ in range(number_of_labels):
+                legacy_label(template_root, table)
+            legacy_time = (time.perf_counter() - start) / number_of_labels
+
+            start = time.perf_counter()
+            for _ in range(number_of_labels):
+                product.new_product(data_file_name)
+                product.close_product()
+            current_time = (time.perf_counter() - start) / number_of_labels
+
+            print("%-8d %-28s %20.1f" % (number_of_fields, "before (ElementTree nodes)", legacy_time * 1e6))
+            print("%-8d %-28s %20.1f" % (number_of_fields, "close_product", current_time * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Micro-benchmark of the per-record cost of TableCharacter.add_record
+
+It compares the record formatting done before the record format was compiled (rebuilding the template and formatting
+every field twice for each record) with the current add_record and with the column-wise add_records.
+
+Run it from the root of the repository:
+    python benchmarks/bench_record_formatter.py [number_of_records]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from easypds4writer.table_character import TableCharacter, PDS4meInputError
+
+
+def legacy_add_record(table, record):
+    """Copy of the add_record implementation without compiled record format, used as the reference"""
+    i = 0
+    formatted_record_template = ""
+    for field in record:
+        field_width = int(table._record_character.field_character[i].parsed_field_format.width)
+        field_format = table._record_character.field_character[i].field_format
+        formatted_field = field_format % field
+        if len(formatted_field) > field_width:
+            raise PDS4meInputError(field, "Value %s is wider than the field" % formatted_field)
+        if i == 0:
+            formatted_record_template = field_format
+        else:
+            formatted_record_template = formatted_record_template + ", " + field_format
+        i = i + 1
+    formatted_record_template += "\n"
+    formatted_record = formatted_record_template % record
+    table._fp_data_file.write(formatted_record)
+    table._record_character._record_length = len(formatted_record) + 1
+    table._records = table._records + 1
+
+
+def new_table(fp_data_file, number_of_fields):
+    table = TableCharacter("benchmark")
+    for i in range(number_of_fields):
+        if i % 3 == 0:
+            table.declare_field("%-12s", "ASCII_String", "string_%d" % i, "none", "String field")
+        elif i % 3 == 1:
+            table.declare_field("%10.4f", "ASCII_Real", "real_%d" % i, "none", "Real field")
+        else:
+            table.declare_field("%8d", "ASCII_Integer", "integer_%d" % i, "none", "Integer field")
+    table.reset()
+    table.set_file_pointers(fp_data_file)
+    return table
+
+
+def new_records(number_of_records, number_of_fields):
+    values = ("value", 3.14159, 42)
+    record = tuple(values[i % 3] for i in range(number_of_fields))
+    return [record] * number_of_records
+
+
+def time_per_record(function, number_of_records):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) / number_of_records * 1e9
+
+
+def main():
+    number_of_records = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print("%-8s %-22s %16s" % ("fields", "method", "ns per record"))
+    with open(os.devnull, "w", newline="\r\n") as fp_data_file:
+        for number_of_fields in (3, 12, 48):
+            records = new_records(number_of_records, number_of_fields)
+            columns = [list(column) for column in zip(*records)]
+            table = new_table(fp_data_file, number_of_fields)
+
+            def run_legacy():
+                for record in records:
+                    legacy_add_record(table, record)
+
+            def run_add_record():
+                for record in records:
+                    table.add_record(record)
+
+            def run_add_records():
+                table.add_records(columns)
+
+            for method, function in (("before (per field)", run_legacy), ("add_record", run_add_record),
+                                     ("add_records", run_add_records)):
+                print("%-8d %-22s %16.0f" % (number_of_fields, method, time_per_record(function, number_of_records)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Benchmark suite of the write pipeline of ProductObservational
+
+It measures declare_field, add_record and add_records throughput for a narrow (3 fields) and a wide (100 fields)
+table, close_product label generation for different numbers of fields and template variables, and the whole
+new_product/close_product cycle for each template in easypds4writer/test/example_templates. Every case runs in its own
+process so its peak resident memory (peak RSS) can be reported. Results are written as JSON so runs of different
+versions can be compared. Everything is written to a temporary directory and no network access is needed.
+
+Run it from the root of the repository:
+    python benchmarks/run_benchmarks.py [--quick] [--output results.json] [--case name ...]
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where peak RSS is not reported
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from easypds4writer.product_observational import ProductObservational
+
+TEMPLATES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "easypds4writer", "test",
+                                   "example_templates")
+TEMPLATE = os.path.join(TEMPLATES_DIRECTORY, "example_template.xml")
+
+# Size of each case: (full run, --quick run)
+SIZES = {"declared_fields": (1000, 100),
+         "narrow_records": (300000, 20000),
+         "wide_records": (20000, 2000),
+         "labels": (200, 20),
+         "products": (500, 50)}
+
+
+def declare_fields(table, number_of_fields):
+    """Declares fields cycling through a string, a real and an integer field"""
+    for field_index in range(number_of_fields):
+        kind = field_index % 3
+        if kind == 0:
+            table.declare_field("%-12s", "ASCII_String", "name_%d" % field_index, "none", "String field")
+        elif kind == 1:
+            table.declare_field("%10.4f", "ASCII_Real", "value_%d" % field_index, "m", "Real field")
+        else:
+            table.declare_field("%8d", "ASCII_Integer", "counter_%d" % field_index, "none", "Integer field")
+
+
+def make_record(number_of_fields, record_index):
+    values = ("name_%d" % (record_index % 1000), record_index * 0.25, record_index)
+    return tuple(values[field_index % 3] for field_index in range(number_of_fields))
+
+
+def make_template(output_directory, number_of_variables):
+    """Writes a copy of the example template with the given number of $variable placeholders"""
+    with open(TEMPLATE, encoding="utf-8-sig") as fp_template:
+        template = fp_template.read()
+    variables = "".join("<benchmark_variable_%d>$variable_%d</benchmark_variable_%d>\n" % (i, i, i)
+                        for i in range(number_of_variables))
+    template = template.replace("</Identification_Area>", variables + "</Identification_Area>", 1)
+    template_name = os.path.join(output_directory, "template_%d_variables.xml" % number_of_variables)
+    with open(template_name, "w", encoding="utf-8") as fp_template:
+        fp_template.write(template)
+    return template_name
+
+
+def bench_declare_field(output_directory, size):
+    start = time.perf_counter()
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("benchmark")
+    declare_fields(table, size)
+    declare_elapsed = time.perf_counter() - start
+    # The record format is compiled the first time a record is written
+    table._record_character.compiled_format()
+    compile_elapsed = time.perf_counter() - start - declare_elapsed
+    return {"fields": size, "fields_per_s": size / declare_elapsed, "ns_per_field": declare_elapsed / size * 1e9,
+            "compile_s": compile_elapsed}
+
+
+def bench_records(output_directory, size, number_of_fields, block_size):
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("benchmark")
+    declare_fields(table, number_of_fields)
+    records = [make_record(number_of_fields, record_index) for record_index in range(size)]
+    data_file_name = os.path.join(output_directory, "records.tab")
+    product.new_product(data_file_name)
+    start = time.perf_counter()
+    if block_size:
+        for first in range(0, size, block_size):
+            table.add_records(list(zip(*records[first:first + block_size])))
+    else:
+        for record in records:
+            table.add_record(record)
+    product._fp_data_file.flush()
+    elapsed = time.perf_counter() - start
+    product.close_product()
+    data_size = os.path.getsize(data_file_name)
+    return {"fields": number_of_fields, "rows": size, "rows_per_s": size / elapsed,
+            "mb_per_s": data_size / elapsed / 1e6, "bytes": data_size}
+
+
+def bench_labels(output_directory, size, number_of_fields, number_of_variables):
+    product = ProductObservational(make_template(output_directory, number_of_variables))
+    table = product.declare_table_character("benchmark")
+    declare_fields(table, number_of_fields)
+    record = make_record(number_of_fields, 0)
+    latencies = []
+    for product_index in range(size):
+        product.new_product(os.path.join(output_directory, "label_%d.tab" % product_index))
+        for variable_index in range(number_of_variables):
+            product.set_metadata("$variable_%d" % variable_index, "value %d" % variable_index)
+        table.add_record(record)
+        start = time.perf_counter()
+        product.close_product()
+        latencies.append(time.perf_counter() - start)
+    return dict(latency_statistics(latencies), fields=number_of_fields, variables=number_of_variables, labels=size)
+
+
+def bench_product_cycle(output_directory, size, template_name):
+    product = ProductObservational(os.path.join(TEMPLATES_DIRECTORY, template_name))
+    table = product.declare_table_character("benchmark")
+    declare_fields(table, 10)
+    records = [make_record(10, record_index) for record_index in range(10)]
+    latencies = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for product_index in range(size):
+            start = time.perf_counter()
+            product.new_product(os.path.join(output_directory, "product_%d.tab" % product_index))
+            table.write_from(records)
+            product.close_product()
+            latencies.append(time.perf_counter() - start)
+    return dict(latency_statistics(latencies), template=template_name, products=size,
+                products_per_s=size / sum(latencies))
+
+
+def latency_statistics(latencies):
+    latencies = sorted(latencies)
+    return {"latency_mean_ms": sum(latencies) / len(latencies) * 1e3,
+            "latency_p50_ms": latencies[len(latencies) // 2] * 1e3,
+            "latency_p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1e3}
+
+
+def cases():
+    """Returns a dictionary of case name: (function, size key, extra arguments)"""
+    all_cases = {"declare_field": (bench_declare_field, "declared_fields", ())}
+    for schema, number_of_fields, size_key in (("narrow", 3, "narrow_records"), ("wide", 100, "wide_records")):
+        all_cases["add_record_%s" % schema] = (bench_records, size_key, (number_of_fields, 0))
+        all_cases["add_records_%s" % schema] = (bench_records, size_key, (number_of_fields, 1000))
+    for number_of_fields in (10, 100, 1000):
+        for number_of_variables in (0, 10, 100):
+            all_cases["close_product_%d_fields_%d_variables" % (number_of_fields, number_of_variables)] = \
+                (bench_labels, "labels", (number_of_fields, number_of_variables))
+    for template_name in sorted(os.listdir(TEMPLATES_DIRECTORY)):
+        if template_name.endswith(".xml"):
+            all_cases["product_cycle_%s" % os.path.splitext(template_name)[0]] = \
+                (bench_product_cycle, "products", (template_name,))
+    return all_cases
+
+
+def run_case(name, quick):
+    function, size_key, arguments = cases()[name]
+    size = SIZES[size_key][1 if quick else 0]
+    with tempfile.TemporaryDirectory() as output_directory:
+        result = function(output_directory, size, *arguments)
+    result["peak_rss_bytes"] = peak_rss()
+    return result
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    # ru_maxrss is given in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the write pipeline of easypds4writer")
+    parser.add_argument("--quick", action="store_true", help="run smaller cases, e.g. to check the suite works")
+    parser.add_argument("--output", help="file where the JSON results are written, by default the standard output")
+    parser.add_argument("--case", action="append", choices=sorted(cases()),
+                        help="run only this case, it can be repeated")
+    arguments = parser.parse_args()
+
+    results = {}
+    for name in arguments.case or cases():
+        # A new process per case so the peak RSS of one case does not include the others
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results[name] = executor.submit(run_case, name, arguments.quick).result()
+        print("%-45s done" % name, file=sys.stderr)
+
+    report = {"created": datetime.datetime.utcnow().isoformat() + "Z",
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "quick": arguments.quick,
+              "results": results}
+    if arguments.output:
+        with open(arguments.output, "w") as fp_output:
+            json.dump(report, fp_output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
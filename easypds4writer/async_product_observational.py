@@ -0,0 +1,100 @@
+"""
+AsyncProductObservational Module
+Public classes in the module:
+  AsyncProductObservational
+"""
+import asyncio
+from easypds4writer.product_observational import ProductObservational
+
+# Default number of blocks of records waiting to be written to the data file
+DEFAULT_QUEUE_SIZE = 16
+
+
+class AsyncProductObservational:
+    """"
+    AsyncProductObservational class: Writes PDS4 products from asyncio code without blocking the event loop.
+
+      It wraps a ProductObservational writing the data file in binary mode through a dedicated thread. Records are
+      formatted on the event loop thread (those of add_records in the default executor of the event loop), or in
+      format_executor if given, and handed to the writing thread through a bounded queue. When the queue is full the coroutines adding records wait until there is room. Opening the files
+      and writing the label are done in the default executor of the event loop.
+      Records added to the same table by concurrent coroutines (e.g. with asyncio.gather) are written in the order
+      the calls were made, one block at a time.
+      Methods:
+        __init__(self, template_name, queue_size=DEFAULT_QUEUE_SIZE, format_executor=None, **options):
+                                                options are passed to ProductObservational.
+        declare_table_character(self, name=""): As in ProductObservational.
+        await new_product(self, data_file_name, resume=False): As in ProductObservational.
+        set_metadata(self, variable, value):    As in ProductObservational.
+        await add_record(self, table, record):  Adds a record to one of the declared tables.
+        await add_records(self, table, columns): Adds a block of records given column by column to a declared table.
+        await close_product(self):              Waits until all the records are written and writes the label.
+    """
+
+    def __init__(self, template_name, queue_size=DEFAULT_QUEUE_SIZE, format_executor=None, **options):
+        """"
+        Initialization method
+
+        Arguments:
+            template_name: String consisting on a template name possibly with a path.
+            queue_size: Maximum number of blocks of records waiting to be written to the data file.
+            format_executor: concurrent.futures.Executor (e.g. a ThreadPoolExecutor) where the records are formatted.
+                             By default they are formatted on the event loop thread.
+            options: Other arguments of ProductObservational. binary and write_queue_size are always set.
+        """
+        options["binary"] = True
+        options["write_queue_size"] = queue_size
+        self.product_observational = ProductObservational(template_name, **options)
+        self._format_executor = format_executor
+        # asyncio.Lock of each table, so the blocks of a table are written one after the other in the order they were
+        # added even if format_executor has several threads. Without format_executor a single lock is used for all
+        # the tables, as the room in the queue is reserved for one block at a time.
+        self._table_locks = {}
+        self._writing_lock = asyncio.Lock()
+
+    def declare_table_character(self, name=""):
+        return self.product_observational.declare_table_character(name)
+
+    async def new_product(self, data_file_name, resume=False):
+        await asyncio.get_running_loop().run_in_executor(None, self.product_observational.new_product, data_file_name,
+                                                           resume)
+
+    def set_metadata(self, variable, value):
+        self.product_observational.set_metadata(variable, value)
+
+    async def add_record(self, table, record):
+        await self._run_writing(table, table.add_record, record)
+
+    async def add_records(self, table, columns):
+        await self._run_writing(table, table.add_records, columns, single_block=False)
+
+    async def close_product(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.product_observational.close_product)
+
+    async def _run_writing(self, table, method, argument, single_block=True):
+        loop = asyncio.get_running_loop()
+        if self._format_executor is not None:
+            # The executor thread waits if the queue is full, the event loop does not
+            if table not in self._table_locks:
+                self._table_locks[table] = asyncio.Lock()
+            async with self._table_locks[table]:
+                await loop.run_in_executor(self._format_executor, method, argument)
+            return
+        # The records are formatted and queued on the event loop thread, so first take (in another thread) the room
+        # for their block in the queue, which the block then uses without blocking
+        async with self._writing_lock:
+            if not single_block:
+                # The records can be queued as several blocks, whose room cannot be reserved beforehand, so they are
+                # formatted and queued in another thread, which can wait for room without blocking the event loop
+                await loop.run_in_executor(None, method, argument)
+                return
+            data_writer = self.product_observational._fp_data_file
+            if data_writer is None or not hasattr(data_writer, "reserve"):
+                method(argument)
+                return
+            await loop.run_in_executor(None, data_writer.reserve)
+            try:
+                method(argument)
+            finally:
+                # The room is given back if the records were not written, e.g. because of an error
+                data_writer.cancel_reservation()
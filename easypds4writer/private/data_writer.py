@@ -0,0 +1,373 @@
+import errno
+import hashlib
+import io
+import mmap
+import os
+import queue
+import tempfile
+import threading
+
+"""Data writers are the file like objects the PDS4 objects write their records to. They receive text where the line
+ending is \n, as a file opened in text mode with newline='\r\n' would, and write it as ASCII bytes with CR LF line
+endings."""
+
+# Size of the blocks used to copy data between files when a zero-copy system call is not available
+COPY_BUFFER_SIZE = 1024 * 1024
+# Maximum number of blocks of records waiting to be hashed by the thread of a HashingDataWriter
+HASH_QUEUE_SIZE = 16
+
+
+def encode_records(text):
+    """Encodes a block of formatted records as ASCII bytes replacing the \n line endings by CR LF"""
+    return text.encode("ascii").replace(b"\n", b"\r\n")
+
+
+def write_all(fp_output, data):
+    """Writes data to the unbuffered binary file fp_output, whose write may write only part of it"""
+    data = memoryview(data)
+    while data:
+        data = data[fp_output.write(data):]
+
+
+class BinaryDataWriter:
+    """Writes the records to a data file opened in binary mode with a large buffer. The records are encoded once and
+    the CR LF line endings are written explicitly. The number of bytes written is tracked so tell() does not have to
+    query the file."""
+
+    def __init__(self, data_file_name, buffer_size, append=False):
+        # In append mode the records are written after the current content of the file
+        self._fp = open(data_file_name, "ab" if append else "wb", buffering=buffer_size)
+        self._position = self._fp.tell()
+
+    def write(self, text):
+        self.write_encoded(encode_records(text))
+
+    def write_encoded(self, data):
+        """Writes records already encoded with encode_records"""
+        self._fp.write(data)
+        self._position += len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        self._fp.flush()
+
+    def fileno(self):
+        return self._fp.fileno()
+
+    def close(self):
+        self._fp.close()
+
+
+class HashingDataWriter:
+    """Writes the records with another data writer that accepts encoded records (e.g. a BinaryDataWriter) and updates
+    an MD5 hash of everything written, so the checksum of the data file is known when it is closed without reading it
+    again. If background is True the hash is updated by a dedicated thread, which runs in parallel with the caller as
+    hashlib releases the GIL for large blocks."""
+
+    def __init__(self, data_writer, background=False):
+        self._data_writer = data_writer
+        self._md5 = hashlib.md5()
+        self._queue = None
+        if background:
+            self._queue = queue.Queue(HASH_QUEUE_SIZE)
+            self._thread = threading.Thread(target=self._hash_blocks, name="EasyPDS4writer data hasher", daemon=True)
+            self._thread.start()
+
+    def hash_existing_data(self, data_file_name, size):
+        """Updates the hash with the first size bytes of data_file_name, which the records will follow (e.g. the data
+        kept when a product is resumed)"""
+        with open(data_file_name, "rb") as fp_data_file:
+            while size > 0:
+                data = fp_data_file.read(min(size, COPY_BUFFER_SIZE))
+                if not data:
+                    break
+                self._update(data)
+                size -= len(data)
+
+    def write(self, text):
+        self.write_encoded(encode_records(text))
+
+    def write_encoded(self, data):
+        self._data_writer.write_encoded(data)
+        self._update(data)
+
+    def tell(self):
+        return self._data_writer.tell()
+
+    def flush(self):
+        self._data_writer.flush()
+
+    def fileno(self):
+        return self._data_writer.fileno()
+
+    def hexdigest(self):
+        """Returns the MD5 checksum of the data written so far as a string of hexadecimal digits"""
+        if self._queue is not None:
+            self._queue.join()
+        return self._md5.hexdigest()
+
+    def close(self):
+        if self._queue is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._queue = None
+        self._data_writer.close()
+
+    def _update(self, data):
+        if self._queue is None:
+            self._md5.update(data)
+        else:
+            self._queue.put(data)
+
+    def _hash_blocks(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                self._queue.task_done()
+                return
+            self._md5.update(data)
+            self._queue.task_done()
+
+
+class QueuedDataWriter:
+    """Hands the records to a dedicated thread that writes them with a BinaryDataWriter, so the caller does not wait
+    for the disk. The records are encoded by the caller. At most queue_size blocks of records wait to be written, when
+    the queue is full write blocks until there is room (backpressure). An error of the writing thread is raised by
+    every later call to write, flush or close, as the records given after it are not written."""
+
+    def __init__(self, data_writer, queue_size):
+        self._data_writer = data_writer
+        self._queue = queue.Queue()
+        # One unit per block that can still be queued. It is taken by write and given back once the block is written.
+        self._room = threading.Semaphore(queue_size)
+        # Units taken by reserve and not used yet by write
+        self._reserved_blocks = 0
+        self._reservation_lock = threading.Lock()
+        self._position = data_writer.tell()
+        self._error = None
+        self._thread = threading.Thread(target=self._write_blocks, name="EasyPDS4writer data writer", daemon=True)
+        self._thread.start()
+
+    def write(self, text):
+        self.write_encoded(encode_records(text))
+
+    def write_encoded(self, data):
+        self._raise_error()
+        if not (self._reserved_blocks and self._use_reservation()):
+            self._room.acquire()
+        self._queue.put(data)
+        self._position += len(data)
+
+    def tell(self):
+        return self._position
+
+    def reserve(self):
+        """Blocks until one more block can be queued and keeps that room for the next block written, which then does
+        not block. It lets a thread wait for room on behalf of another one."""
+        self._room.acquire()
+        with self._reservation_lock:
+            self._reserved_blocks += 1
+
+    def cancel_reservation(self):
+        """Gives back the room kept by reserve if no block was written with it"""
+        if self._use_reservation():
+            self._room.release()
+
+    def _use_reservation(self):
+        # Takes one of the reserved units, returning False if there is none
+        with self._reservation_lock:
+            if self._reserved_blocks == 0:
+                return False
+            self._reserved_blocks -= 1
+            return True
+
+    def flush(self):
+        """Waits until all the queued records are written and flushes the data file"""
+        self._queue.join()
+        self._raise_error()
+        self._data_writer.flush()
+
+    def fileno(self):
+        return self._data_writer.fileno()
+
+    def close(self):
+        """Waits until all the queued records are written and closes the data file"""
+        self._queue.put(None)
+        self._thread.join()
+        self._data_writer.close()
+        self._raise_error()
+
+    def _write_blocks(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                self._queue.task_done()
+                return
+            # After an error the remaining blocks are discarded so the caller is never blocked
+            if self._error is None:
+                try:
+                    self._data_writer.write_encoded(data)
+                except Exception as error:
+                    self._error = error
+            self._room.release()
+            self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+
+class MappedDataFile:
+    """Data file created with its final size and mapped in memory, so the records of each PDS4 object can be written
+    directly at their final position. Each object writes to its own MappedRegion."""
+
+    def __init__(self, data_file_name, size):
+        self._fp = open(data_file_name, "w+b")
+        self.size = size
+        self._map = None
+        if size > 0:
+            # Reserve the disk space now if the platform allows it so running out of space is reported here and not
+            # as a SIGBUS when the mapped memory is written. Only if the platform or the file system cannot reserve
+            # it the file is just extended.
+            try:
+                os.posix_fallocate(self._fp.fileno(), 0, size)
+            except AttributeError:
+                os.ftruncate(self._fp.fileno(), size)
+            except OSError as error:
+                if error.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    self._fp.close()
+                    raise
+                os.ftruncate(self._fp.fileno(), size)
+            self._map = mmap.mmap(self._fp.fileno(), size)
+
+    def region(self, offset, size, record_length):
+        """Returns the MappedRegion of size bytes starting at byte offset of the file, made of records of
+        record_length bytes"""
+        return MappedRegion(self._map, offset, size, record_length)
+
+    def hexdigest(self):
+        """Returns the MD5 checksum of the whole file. Records can be written in any order so it is computed from the
+        mapped memory, where the records already are, once they are all written."""
+        return hashlib.md5(self._map if self._map is not None else b"").hexdigest()
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._fp.close()
+
+
+class MappedRegion:
+    """Part of a MappedDataFile reserved to one PDS4 object. It can be written as a file, one block after the other,
+    or at any position with write_encoded_at, also from several threads at once as long as they write disjoint
+    ranges. tell() gives the position in the data file as for the other data writers."""
+
+    def __init__(self, mapped_memory, offset, size, record_length):
+        self._map = mapped_memory
+        self.offset = offset
+        self.size = size
+        self.record_length = record_length
+        # Position, relative to the region, where write places the next block
+        self._position = 0
+        # One byte per record of the region, set to 1 once the record is written. Threads write different records so
+        # they set different bytes.
+        self._written_records = bytearray(size // record_length if record_length else 0)
+
+    def write(self, text):
+        self.write_encoded(encode_records(text))
+
+    def write_encoded(self, data):
+        self.write_encoded_at(self._position, data)
+        self._position += len(data)
+
+    def write_encoded_at(self, position, data):
+        """Writes data, already encoded, at position bytes from the beginning of the region"""
+        if position < 0 or position + len(data) > self.size:
+            raise ValueError("%d bytes at position %d do not fit in a region of %d bytes" %
+                             (len(data), position, self.size))
+        start = self.offset + position
+        self._map[start:start + len(data)] = data
+        first_record = position // self.record_length
+        end_record = (position + len(data) + self.record_length - 1) // self.record_length
+        self._written_records[first_record:end_record] = b"\x01" * (end_record - first_record)
+
+    def records_written(self):
+        """Returns the number of different records written so far"""
+        return len(self._written_records) - self._written_records.count(0)
+
+    def tell(self):
+        return self.offset + self._position
+
+
+class DataSegment:
+    """Holds in memory the data written by one PDS4 object until it is copied to the data file. If the data grows
+    beyond spill_threshold bytes it is moved to an anonymous temporary file so memory use stays bounded."""
+
+    def __init__(self, spill_threshold):
+        self._spill_threshold = spill_threshold
+        self._buffer = io.BytesIO()
+        self._file = None
+        # Number of bytes written so far. It is the position where the next record will be written.
+        self._position = 0
+
+    def write(self, text):
+        self.write_encoded(encode_records(text))
+
+    def write_encoded(self, data):
+        if self._file is None and self._position + len(data) > self._spill_threshold:
+            self._file = tempfile.TemporaryFile()
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        if self._file is None:
+            self._buffer.write(data)
+        else:
+            self._file.write(data)
+        self._position += len(data)
+
+    def tell(self):
+        return self._position
+
+    def copy_to(self, fp_output, md5=None):
+        """Appends the content of the segment to fp_output, which must be an unbuffered binary file. If md5 is given
+        (a hashlib hash) it is updated with the content, which is then copied through Python instead of by the
+        kernel."""
+        if self._file is None:
+            write_all(fp_output, self._buffer.getbuffer())
+            if md5 is not None:
+                md5.update(self._buffer.getbuffer())
+            return
+        self._file.flush()
+        copied = 0
+        if md5 is not None:
+            self._file.seek(0)
+            for data in iter(lambda: self._file.read(COPY_BUFFER_SIZE), b""):
+                md5.update(data)
+                write_all(fp_output, data)
+            return
+        if hasattr(os, "sendfile"):
+            # Let the kernel copy the data between both files without going through Python. os.sendfile writes at
+            # the current position of the output file and advances it.
+            try:
+                while copied < self._position:
+                    sent = os.sendfile(fp_output.fileno(), self._file.fileno(), copied, self._position - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+            except OSError:
+                # Some platforms only support sockets as output of sendfile. The rest is copied below.
+                pass
+        self._file.seek(copied)
+        for data in iter(lambda: self._file.read(COPY_BUFFER_SIZE), b""):
+            write_all(fp_output, data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._buffer = None
+        self._file = None
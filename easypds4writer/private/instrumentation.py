@@ -0,0 +1,100 @@
+import time
+
+"""Statistics collected while writing a product when ProductObservational is created with collect_stats=True or a
+stats_callback. Counters and timers are plain attributes updated in place so collecting them costs a few clock reads
+per block of records, and when statistics are not collected the PDS4 objects only check that they have none."""
+
+# Phases of a product timed by ProductStats. Times of the records are kept per table in TableStats.
+#   template: parsing (or taking from the cache) the template in new_product
+#   open: creating or opening the data file in new_product
+#   segments: copying the segments to the data file in segmented mode
+#   label: generating the File_Area_Observational and rendering or serializing the label
+#   metadata: replacing the variables of the label by their values
+#   label_write: writing the label file
+PHASES = ("template", "open", "segments", "label", "metadata", "label_write")
+LABEL_PHASES = ("label", "metadata", "label_write")
+
+
+class TableStats:
+    """Counters and timers of the records written to one table of a product. Times are in seconds. bytes counts the
+    bytes of the data file, including the CR LF line endings. When records are written from several threads at once
+    the counters may miss some of their updates."""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.validate_time = 0.0
+        self.format_time = 0.0
+        self.write_time = 0.0
+
+    def validate(self, validate_function, columns):
+        start = time.perf_counter()
+        validate_function(columns)
+        self.validate_time += time.perf_counter() - start
+
+    def format(self, format_function, records):
+        """Calls format_function(records) and returns its result, adding the time taken to format_time"""
+        start = time.perf_counter()
+        formatted_records = format_function(records)
+        self.format_time += time.perf_counter() - start
+        return formatted_records
+
+    def write(self, write_function, formatted_records, number_of_records):
+        """Calls write_function(formatted_records), adding the time taken to write_time and counting the records"""
+        start = time.perf_counter()
+        write_function(formatted_records)
+        self.write_time += time.perf_counter() - start
+        self.rows += number_of_records
+        # Text has one \n per record, which is written as CR LF, whereas encoded records already have CR LF
+        if isinstance(formatted_records, str):
+            self.bytes += len(formatted_records) + number_of_records
+        else:
+            self.bytes += len(formatted_records)
+
+    def as_dict(self):
+        return {"name": self.name, "rows": self.rows, "bytes": self.bytes, "validate_time": self.validate_time,
+                "format_time": self.format_time, "write_time": self.write_time}
+
+
+class ProductStats:
+    """Statistics of one product: the time of each phase (see PHASES) in the dictionary phase_times and one
+    TableStats per declared table in tables, in the order they were declared."""
+
+    def __init__(self, data_file_name, table_names):
+        self.data_file_name = data_file_name
+        self.tables = [TableStats(name) for name in table_names]
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        # Size of the label file in characters
+        self.label_bytes = 0
+
+    def add_phase_time(self, phase, start):
+        """Adds to phase the time elapsed since start, a time.perf_counter() value"""
+        self.phase_times[phase] += time.perf_counter() - start
+
+    @property
+    def rows(self):
+        return sum(table.rows for table in self.tables)
+
+    @property
+    def bytes(self):
+        return sum(table.bytes for table in self.tables)
+
+    @property
+    def format_time(self):
+        return sum(table.format_time for table in self.tables)
+
+    @property
+    def write_time(self):
+        return sum(table.write_time for table in self.tables)
+
+    @property
+    def label_time(self):
+        return sum(self.phase_times[phase] for phase in LABEL_PHASES)
+
+    def as_dict(self):
+        """Returns the statistics as a dictionary that can be saved as JSON"""
+        return {"data_file_name": self.data_file_name, "rows": self.rows, "bytes": self.bytes,
+                "format_time": self.format_time, "write_time": self.write_time, "label_time": self.label_time,
+                "label_bytes": self.label_bytes, "phase_times": dict(self.phase_times),
+                "tables": [table.as_dict() for table in self.tables]}
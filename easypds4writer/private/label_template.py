@@ -0,0 +1,116 @@
+import copy
+import re
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+"""Label templates compiled once so the label of each product can be rendered by joining strings. The template is
+serialized, with the same indentation the final label will have, with an empty element in the place of the
+File_Area_Observational. That serialization is split in static chunks and placeholders ($variables) which are filled
+with the metadata of each product."""
+
+# Placeholders are a $ followed by a name made of letters, digits and underscores, e.g. $start_time
+PLACEHOLDER_PATTERN = re.compile(r"\$[A-Za-z_]\w*")
+
+# Element that marks in the serialized template where the File_Area_Observational of each product goes
+_FILE_AREA_MARKER = "EasyPDS4writer_File_Area_Observational"
+
+# Location of a placeholder in the template.
+#   path: tags (without namespace) from the root to the element containing the placeholder, separated by /
+#   where: "text" or "tail" of the element, or the name of the attribute preceded by @
+PlaceholderLocation = namedtuple("PlaceholderLocation", "path where")
+
+
+def indent(elem, level=0):
+    """Adds new lines and four spaces per level as text and tail of the elements so the label is pretty printed. The
+    tree is walked with an explicit stack instead of recursion."""
+    if len(elem) or level:
+        _indent_tail(elem, "\n" + level*"    ")
+    elements = [(elem, level)]
+    while elements:
+        elem, level = elements.pop()
+        if len(elem):
+            i = "\n" + level*"    "
+            if not elem.text or not elem.text.strip():
+                elem.text = i + "    "
+            # Each child is followed by the indentation of the next one except the last, which is followed by the
+            # indentation of the closing tag of its parent
+            child_indentation = i + "    "
+            for child in elem:
+                _indent_tail(child, child_indentation)
+                elements.append((child, level+1))
+            _indent_tail(elem[-1], i)
+
+
+def _indent_tail(elem, tail):
+    if not elem.tail or not elem.tail.strip():
+        elem.tail = tail
+
+
+def _local_name(tag):
+    return tag.rpartition("}")[2]
+
+
+class CompiledTemplate:
+    """Label template compiled for rendering. Attributes:
+        root: root element of the parsed template. It is shared and must not be modified.
+        placeholders: dictionary with the variables found in the template and a list of their PlaceholderLocation
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.placeholders = {}
+        self._index_placeholders()
+
+        # Serialize the template with the marker as the last child of the root, which is where the
+        # File_Area_Observational is appended, so the indentation is the same as in the final label
+        label = copy.deepcopy(root)
+        ET.SubElement(label, _FILE_AREA_MARKER)
+        indent(label, 0)
+        serialized_template = ET.tostring(label, encoding="us-ascii").decode("ascii")
+        before, _, after = serialized_template.partition("<%s />" % _FILE_AREA_MARKER)
+
+        # Static chunks are in the even positions of the lists and the variables in the odd positions
+        self._chunks_before = self._interleave(before)
+        self._chunks_after = self._interleave(after)
+
+    def render(self, metadata, file_area_observational):
+        """Returns the label as a string. metadata is a dictionary of variables and values, the variables not in it
+        are left as they are. file_area_observational is the serialized File_Area_Observational, indented for level 1
+        and without tail."""
+        return "".join(self._fill(self._chunks_before, metadata) + [file_area_observational] +
+                       self._fill(self._chunks_after, metadata))
+
+    def _index_placeholders(self):
+        elements = [(self.root, _local_name(self.root.tag))]
+        while elements:
+            element, path = elements.pop()
+            self._index_text(element.text, path, "text")
+            self._index_text(element.tail, path, "tail")
+            for name, value in element.attrib.items():
+                self._index_text(value, path, "@" + _local_name(name))
+            for child in reversed(element):
+                if isinstance(child.tag, str):
+                    elements.append((child, path + "/" + _local_name(child.tag)))
+
+    def _index_text(self, text, path, where):
+        if text:
+            for variable in PLACEHOLDER_PATTERN.findall(text):
+                self.placeholders.setdefault(variable, []).append(PlaceholderLocation(path, where))
+
+    @staticmethod
+    def _interleave(text):
+        chunks = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            chunks.append(text[position:match.start()])
+            chunks.append(match.group(0))
+            position = match.end()
+        chunks.append(text[position:])
+        return chunks
+
+    @staticmethod
+    def _fill(chunks, metadata):
+        filled = list(chunks)
+        for i in range(1, len(filled), 2):
+            filled[i] = metadata.get(filled[i], filled[i])
+        return filled
@@ -0,0 +1,73 @@
+"""The Label Writer streams XML elements as text, pretty printed with four spaces per level, producing exactly what
+ElementTree would write (encoded as us-ascii) for the same elements after indenting them. It is used to write the
+File_Area_Observational of the labels without building ElementTree nodes."""
+
+
+def escape(text):
+    """Escapes the text of an element as ElementTree does and replaces non ASCII characters by character references"""
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text.encode("ascii", "xmlcharrefreplace").decode("ascii")
+
+
+class LabelWriter:
+    def __init__(self, level=0, inside_element=False):
+        # Level of the first element written, which is not preceded by a new line unless inside_element is True,
+        # meaning the elements written are children of an element written elsewhere
+        self._level = level
+        self._inside_element = inside_element
+        self._parts = []
+        # Tags of the elements started and not yet ended
+        self._open_tags = []
+
+    @property
+    def level(self):
+        """Level of the next element written"""
+        return self._level + len(self._open_tags)
+
+    def child_writer(self):
+        """Returns a new LabelWriter to write separately children of the current element. Its content is added with
+        write."""
+        return LabelWriter(self.level, inside_element=True)
+
+    def start(self, tag):
+        """Starts an element that will contain other elements"""
+        self._new_line()
+        self._parts.append("<%s>" % tag)
+        self._open_tags.append(tag)
+
+    def end(self):
+        """Ends the last element started"""
+        tag = self._open_tags.pop()
+        if self._parts[-1] == "<%s>" % tag:
+            # Elements without children are written as empty elements
+            self._parts[-1] = "<%s />" % tag
+        else:
+            self._parts.append("\n" + "    " * (self._level + len(self._open_tags)) + "</%s>" % tag)
+
+    def element(self, tag, text, unit=None):
+        """Writes an element with text and no children. unit is the value of its unit attribute, if any."""
+        self._new_line()
+        if unit is not None:
+            start_tag = '%s unit="%s"' % (tag, unit)
+        else:
+            start_tag = tag
+        if text:
+            self._parts.append("<%s>%s</%s>" % (start_tag, escape(text), tag))
+        else:
+            self._parts.append("<%s />" % start_tag)
+
+    def write(self, text):
+        """Writes text that is already serialized, indented as a child of the current element"""
+        self._parts.append(text)
+
+    def getvalue(self):
+        return "".join(self._parts)
+
+    def _new_line(self):
+        if self._open_tags or self._inside_element:
+            self._parts.append("\n" + "    " * (self._level + len(self._open_tags)))
@@ -5,10 +5,22 @@ class PDS4Object():
 
     def __init__(self):
         self._fp_data_file= None
+        # Callable without arguments called after each block of records is written and accounted for, or None
+        self._after_write = None
+        # TableStats where the records written are counted and timed, or None if statistics are not collected
+        self._stats = None
 
     def set_file_pointers(self, fp_data_file):
         self._fp_data_file = fp_data_file
 
+    def __getstate__(self):
+        # File pointers cannot be copied to other processes. They are set again by new_product.
+        state = self.__dict__.copy()
+        state["_fp_data_file"] = None
+        state["_after_write"] = None
+        state["_stats"] = None
+        return state
+
     def _update_start_end_bytes(self):
         if not self._already_being_written:
             self._already_being_written= True
@@ -21,3 +33,28 @@ class PDS4Object():
         # file will continue the count from the previous file.
         raise NotImplementedError()
 
+    def _checkpoint_state(self):
+        # Returns a dictionary that can be saved as JSON with the attributes that _restore_checkpoint_state needs to
+        # continue writing this object in a product that was interrupted
+        return {"offset": self._offset, "already_being_written": self._already_being_written}
+
+    def _restore_checkpoint_state(self, state):
+        self._offset = state["offset"]
+        self._already_being_written = state["already_being_written"]
+
+    def _preallocated_size(self, records):
+        # Number of bytes to reserve in the data file for the given number of records of this object
+        raise NotImplementedError()
+
+    def _set_preallocated_records(self, offset, records):
+        # Sets the attributes written to the label for the given number of records preallocated at offset
+        raise NotImplementedError()
+
+    def _label_placeholders(self):
+        # Variables ($placeholders) in the part of the label written by this object, in the order they appear
+        raise NotImplementedError()
+
+    def _end_of_data(self):
+        # Byte just after the last complete record written by this object, or None if it did not write anything
+        raise NotImplementedError()
+
@@ -0,0 +1,158 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+"""Inference of the fields of a table from a NumPy dtype and, optionally, sample data. Every field gets the narrowest
+field_format that can write all the values seen without losing information: integers get the width of their widest
+value, strings the length of their longest value, and reals the fewest decimals (at least one) that represent every
+value exactly or, if none do, an exponential format with enough digits to give back the same values. Without data the
+widths are the ones needed for any value of the dtype. The data is scanned with NumPy one block at a time so a long
+stream of samples never has to be held in memory."""
+
+# Arguments of TableCharacter.declare_field for one field, as returned by infer_field_declarations
+FieldDeclaration = namedtuple("FieldDeclaration", "field_format data_type name unit description")
+
+# Maximum number of decimals tried for a fixed point (%w.pf) format before using an exponential one
+MAX_FIXED_DECIMALS = 15
+# Decimals of the exponential format that give back the same value, by number of bytes of the real type
+_EXPONENTIAL_DECIMALS = {2: 4, 4: 8, 8: 16}
+# Decimal digits of the exponent of the largest value of each real type
+_EXPONENT_DIGITS = {2: 2, 4: 2, 8: 3}
+
+
+def infer_field_declarations(array_or_dtype, sample=None, units=None, descriptions=None):
+    """Returns a FieldDeclaration per field of a structured array or dtype, in order, with the formats needed for the
+    values of sample, which is a structured array or an iterable of them (blocks of a stream). If no sample is given
+    the values of the array are used, or none if a dtype is given. units and descriptions are optional dictionaries
+    by field name, by default the unit is "none" and the description the name of the field."""
+    if hasattr(array_or_dtype, "dtype"):
+        dtype = array_or_dtype.dtype
+        if sample is None:
+            sample = array_or_dtype
+    else:
+        dtype = np.dtype(array_or_dtype)
+    if sample is None:
+        blocks = []
+    elif hasattr(sample, "dtype"):
+        blocks = [sample]
+    else:
+        blocks = sample
+    if dtype.names is None:
+        raise ValueError("a structured dtype (or an array with named fields) is needed, not %s" % dtype)
+    scans = [_ColumnScan(name, dtype[name]) for name in dtype.names]
+    for block in blocks:
+        for scan in scans:
+            scan.update(block[scan.name])
+    units = units or {}
+    descriptions = descriptions or {}
+    return [FieldDeclaration(scan.field_format(), scan.data_type, scan.name, units.get(scan.name, "none"),
+                             descriptions.get(scan.name, scan.name))
+            for scan in scans]
+
+
+class _ColumnScan:
+    """Keeps what the values of one column seen so far require from its field format"""
+
+    def __init__(self, name, dtype):
+        self.name = name
+        self._dtype = dtype
+        kind = dtype.kind
+        if kind == "b":
+            self.data_type = "ASCII_Integer"
+        elif kind == "u":
+            self.data_type = "ASCII_NonNegative_Integer"
+        elif kind == "i":
+            self.data_type = "ASCII_Integer"
+        elif kind == "f":
+            self.data_type = "ASCII_Real"
+        elif kind in "UO":
+            self.data_type = "ASCII_String"
+        else:
+            # Bytes would be written as b'...' and other types have no direct ASCII representation
+            raise ValueError("the field %s has values of type %s which cannot be inferred, convert them to str, int "
+                             "or float" % (name, dtype))
+        self._seen_values = False
+        # Integers: smallest and largest values. Reals: largest absolute value and whether any value is negative.
+        self._minimum = None
+        self._maximum = None
+        self._negative = False
+        # Reals: decimals needed by the values seen, or None once some value needs more than MAX_FIXED_DECIMALS,
+        # and the largest absolute decimal exponent of the values that are not zero
+        self._decimals = 0
+        self._largest_exponent = 0
+        # Strings: length of the longest value
+        self._length = 0
+
+    def update(self, values):
+        values = np.asarray(values)
+        if values.size == 0:
+            return
+        self._seen_values = True
+        kind = self._dtype.kind
+        if kind in "biu":
+            values = values.astype(np.int64) if kind == "b" else values
+            minimum, maximum = int(values.min()), int(values.max())
+            self._minimum = minimum if self._minimum is None else min(self._minimum, minimum)
+            self._maximum = maximum if self._maximum is None else max(self._maximum, maximum)
+        elif kind == "f":
+            self._update_reals(values)
+        elif kind == "U":
+            self._length = max(self._length, int(np.char.str_len(values).max()))
+        else:
+            self._length = max(self._length, max(len(str(value)) for value in values.tolist()))
+
+    def _update_reals(self, values):
+        # NaN and infinite values cannot be written and are reported when the records are added
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        self._negative = self._negative or bool(np.signbit(values).any())
+        absolute_values = np.abs(values)
+        maximum = float(absolute_values.max())
+        self._maximum = maximum if self._maximum is None else max(self._maximum, maximum)
+        nonzero = absolute_values[absolute_values > 0]
+        if nonzero.size:
+            exponents = np.floor(np.log10(nonzero.astype(np.float64)))
+            self._largest_exponent = max(self._largest_exponent, int(abs(exponents.min())), int(abs(exponents.max())))
+        # The values have p decimals if rounding them to p decimals does not change them
+        while self._decimals is not None and not np.array_equal(np.round(values, self._decimals), values):
+            self._decimals = self._decimals + 1 if self._decimals < MAX_FIXED_DECIMALS else None
+
+    def field_format(self):
+        kind = self._dtype.kind
+        if kind in "biu":
+            if not self._seen_values:
+                self._minimum, self._maximum = _integer_range(self._dtype)
+            width = max(len(str(self._minimum)), len(str(self._maximum)))
+            return "%%%dd" % width
+        if kind == "f":
+            return self._real_field_format()
+        if not self._seen_values and kind == "U":
+            self._length = self._dtype.itemsize // 4
+        return "%%-%ds" % max(self._length, 1)
+
+    def _real_field_format(self):
+        itemsize = self._dtype.itemsize
+        decimals = _EXPONENTIAL_DECIMALS.get(itemsize, 16)
+        if not self._seen_values or self._maximum is None:
+            # Any value of the type: sign, digit, point, decimals, e, sign of the exponent and its digits
+            return "%%%d.%de" % (1 + 1 + 1 + decimals + 2 + _EXPONENT_DIGITS.get(itemsize, 3), decimals)
+        sign_width = 1 if self._negative else 0
+        # Rounding to the decimals of the format can take the exponent to the next power of ten
+        exponential_width = sign_width + 1 + 1 + decimals + 2 + max(2, len(str(self._largest_exponent + 1)))
+        if self._decimals is not None:
+            # field_format does not accept a precision of 0, so whole numbers are written with one decimal
+            fixed_decimals = max(self._decimals, 1)
+            integer_digits = len("%.0f" % math.floor(self._maximum))
+            fixed_width = sign_width + integer_digits + 1 + fixed_decimals
+            if fixed_width <= exponential_width:
+                return "%%%d.%df" % (fixed_width, fixed_decimals)
+        return "%%%d.%de" % (exponential_width, decimals)
+
+
+def _integer_range(dtype):
+    if dtype.kind == "b":
+        return 0, 1
+    information = np.iinfo(dtype)
+    return int(information.min), int(information.max)
@@ -18,4 +18,16 @@ class TableBase(PDS4Object):
 
     def reset(self):
         self._records = 0
+        # The offset is taken again when the first record of the new product is written
+        self._already_being_written = False
+        self._offset = -1
 
+
+    def _checkpoint_state(self):
+        state = super()._checkpoint_state()
+        state["records"] = self._records
+        return state
+
+    def _restore_checkpoint_state(self, state):
+        super()._restore_checkpoint_state(state)
+        self._records = state["records"]
@@ -0,0 +1,49 @@
+import os
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+from easypds4writer.private.label_template import CompiledTemplate
+
+"""Cache of parsed and compiled label templates shared by all the ProductObservational objects of the process. Templates are
+identified by their absolute path and modification time, so a template modified on disk is parsed again. The least
+recently used templates are discarded when there are more than MAX_CACHED_TEMPLATES."""
+
+# Maximum number of parsed templates kept in the cache
+MAX_CACHED_TEMPLATES = 32
+
+PDS4_NAMESPACE = "http://pds.nasa.gov/pds4/pds/v1"
+
+_cached_templates = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_template(template_name):
+    """Returns the CompiledTemplate of the template. It is shared, its root element must not be modified and products
+    must work on a copy of it."""
+    path = os.path.abspath(template_name)
+    key = (path, os.stat(path).st_mtime_ns)
+    with _lock:
+        template = _cached_templates.get(key)
+        if template is not None:
+            _cached_templates.move_to_end(key)
+            return template
+
+    # This is done to register a namespace so that the default namespace ns0: does not appear before all XML tags
+    ET.register_namespace('', PDS4_NAMESPACE)
+    template = CompiledTemplate(ET.parse(path).getroot())
+
+    with _lock:
+        # Older versions of the same template will not be used again
+        for cached_key in [cached_key for cached_key in _cached_templates if cached_key[0] == path]:
+            del _cached_templates[cached_key]
+        _cached_templates[key] = template
+        while len(_cached_templates) > MAX_CACHED_TEMPLATES:
+            _cached_templates.popitem(last=False)
+    return template
+
+
+def clear():
+    """Empties the cache"""
+    with _lock:
+        _cached_templates.clear()
@@ -0,0 +1,358 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+
+"""Validation of blocks of records given column by column. Every column is checked at once with NumPy: number of
+values, type of the values against the data_type and field_format of the field, NaN and infinite values and whether
+the formatted values fit in the field width. Widths of numeric columns are estimated with vectorized comparisons
+against the largest value that fits, and only the values close to that limit are actually formatted.
+Single records are validated value by value with the checks compiled once per field by compile_field_checks, which
+find the same problems without NumPy."""
+
+# One problem found in a block of records. row is the index of the record in the block, or None if the problem
+# concerns the whole column (or the whole block, in which case field is None too).
+Violation = namedtuple("Violation", "row field reason")
+
+INTEGER_DATA_TYPES = ("ASCII_Integer", "ASCII_NonNegative_Integer")
+REAL_DATA_TYPES = ("ASCII_Real",)
+
+_INTEGER_SPECIFIERS = {"d": 10, "x": 16, "0": 8}
+_REAL_SPECIFIERS = ("f", "e", "E")
+# Specifiers that only format integers, Python raises TypeError for floats even if they are integral
+_STRICT_INTEGER_SPECIFIERS = ("x", "0")
+# Types of the values checked by the compiled field checks, values of other types are checked as a column of one value
+_SCALAR_TYPES = (bool, int, float)
+
+
+def validate_columns(compiled_format, columns):
+    """Returns the list of Violation found in columns, one sequence or array per field of compiled_format"""
+    violations = []
+    number_of_fields = len(compiled_format.field_formats)
+    if len(columns) != number_of_fields:
+        violations.append(Violation(None, None, "%d columns were provided but the record has %d fields" %
+                                    (len(columns), number_of_fields)))
+        return violations
+
+    number_of_records = len(columns[0]) if columns else 0
+    for field_index, column in enumerate(columns):
+        field_name = compiled_format.field_names[field_index]
+        if len(column) != number_of_records:
+            violations.append(Violation(None, field_name, "%d values were provided but the first column has %d" %
+                                        (len(column), number_of_records)))
+            continue
+        violations.extend(_validate_column(compiled_format, field_index, column))
+    return violations
+
+
+def compile_field_checks(compiled_format):
+    """Returns the checks of every field of compiled_format used by validate_record"""
+    return [_compile_field_check(compiled_format, field_index)
+            for field_index in range(len(compiled_format.field_formats))]
+
+
+def validate_record(field_checks, record):
+    """Returns the list of Violation found in a single record, the same that validate_columns finds in a block with
+    only that record. field_checks are those of compile_field_checks."""
+    if len(record) != len(field_checks):
+        return [Violation(None, None, "%d values were provided but the record has %d fields" %
+                          (len(record), len(field_checks)))]
+    violations = []
+    for field_check, value in zip(field_checks, record):
+        # Most valid values pass a single comparison, only the others are checked in detail
+        if not field_check.accepts(value):
+            violations.extend(field_check.violations(value, 0))
+    return violations
+
+
+def column_width_violations(compiled_format, field_index, column):
+    """Returns the Violation of the values of a NumPy array wider than the field field_index, found with the same
+    vectorized comparisons as validate_columns, or None if the widths of the array cannot be checked this way (e.g.
+    it holds Python objects). Nothing else is checked, non finite values are checked as any other value."""
+    specifier = compiled_format.parsed_field_formats[field_index].specifier
+    if specifier == "s":
+        return _validate_string_column(compiled_format, field_index, column) if column.dtype.kind == "U" else None
+    if column.dtype.kind not in "biuf" or (column.dtype.kind == "f" and specifier in _STRICT_INTEGER_SPECIFIERS):
+        return None
+    if column.dtype.kind == "b":
+        column = column.astype(np.int64)
+    return _width_violations(compiled_format, field_index, column)
+
+
+def _validate_column(compiled_format, field_index, column):
+    field_name = compiled_format.field_names[field_index]
+    parsed_field_format = compiled_format.parsed_field_formats[field_index]
+    data_type = compiled_format.data_types[field_index]
+    specifier = parsed_field_format.specifier
+
+    if specifier == "s":
+        return _validate_string_column(compiled_format, field_index, column)
+
+    # The field format and the data type must agree before looking at the values
+    if data_type in INTEGER_DATA_TYPES and specifier not in _INTEGER_SPECIFIERS:
+        return [Violation(None, field_name, "data_type %s requires an integer field_format but it is %s" %
+                          (data_type, compiled_format.field_formats[field_index]))]
+    if data_type in REAL_DATA_TYPES and specifier not in _REAL_SPECIFIERS:
+        return [Violation(None, field_name, "data_type %s requires a real field_format but it is %s" %
+                          (data_type, compiled_format.field_formats[field_index]))]
+
+    values = np.asarray(column)
+    if values.dtype.kind == "O" and all(type(value) in _SCALAR_TYPES for value in values.tolist()):
+        # Python integers out of the range of the NumPy types are checked one by one
+        field_check = _compile_field_check(compiled_format, field_index)
+        return [violation for row, value in enumerate(values.tolist())
+                for violation in field_check.violations(value, row)]
+    if values.dtype.kind not in "biuf" or (values.dtype.kind == "f" and specifier in _STRICT_INTEGER_SPECIFIERS):
+        return [Violation(None, field_name, "values of type %s cannot be formatted with %s" %
+                          (values.dtype, compiled_format.field_formats[field_index]))]
+    if values.dtype.kind == "b":
+        values = values.astype(np.int64)
+
+    violations = []
+    if values.dtype.kind == "f":
+        not_finite = ~np.isfinite(values)
+        violations.extend(Violation(int(row), field_name, "value is %r" % float(values[row]))
+                          for row in np.flatnonzero(not_finite))
+        if specifier in _INTEGER_SPECIFIERS:
+            not_integer = np.isfinite(values) & (values != np.floor(values))
+            violations.extend(Violation(int(row), field_name, "value %r is not an integer" % float(values[row]))
+                              for row in np.flatnonzero(not_integer))
+        # Non finite values are already reported, they are not checked for width
+        if not_finite.any():
+            values = np.where(not_finite, 0, values)
+
+    if data_type == "ASCII_NonNegative_Integer":
+        violations.extend(Violation(int(row), field_name, "value %r is negative" % values[row].item())
+                          for row in np.flatnonzero(values < 0))
+
+    violations.extend(_width_violations(compiled_format, field_index, values))
+    violations.sort(key=lambda violation: violation.row)
+    return violations
+
+
+def _width_violations(compiled_format, field_index, values):
+    parsed_field_format = compiled_format.parsed_field_formats[field_index]
+    specifier = parsed_field_format.specifier
+    if specifier in _INTEGER_SPECIFIERS:
+        candidates = _integer_width_candidates(values, parsed_field_format, _INTEGER_SPECIFIERS[specifier])
+    elif specifier == "f":
+        candidates = _fixed_point_width_candidates(values, parsed_field_format)
+    else:
+        candidates = _exponential_width_candidates(values, parsed_field_format)
+
+    # Only the candidates are formatted to know for sure whether they fit
+    field_name = compiled_format.field_names[field_index]
+    field_format = compiled_format.field_formats[field_index]
+    field_width = compiled_format.field_widths[field_index]
+    violations = []
+    for row in np.flatnonzero(candidates):
+        formatted_field = field_format % values[row].item()
+        if len(formatted_field) > field_width:
+            violations.append(Violation(int(row), field_name, "value %s is wider than the width of the field which is %d" %
+                                        (formatted_field, field_width)))
+    return violations
+
+
+def _validate_string_column(compiled_format, field_index, column):
+    field_name = compiled_format.field_names[field_index]
+    field_width = compiled_format.field_widths[field_index]
+    # Strings with precision are truncated to the width so they always fit
+    if compiled_format.parsed_field_formats[field_index].precision != -1:
+        return []
+    if isinstance(column, np.ndarray) and column.dtype.kind == "U":
+        # The length of the longest string is known from the array type
+        if column.dtype.itemsize // 4 <= field_width:
+            return []
+        lengths = np.char.str_len(column)
+    else:
+        values = column.tolist() if isinstance(column, np.ndarray) else column
+        try:
+            lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+        except TypeError:
+            # Not all the values are strings, they are formatted as str() by %s
+            lengths = np.fromiter(map(len, map(str, values)), dtype=np.int64, count=len(values))
+    return [Violation(int(row), field_name, "value %r is longer than the width of the field which is %d" %
+                      (str(column[row]), field_width))
+            for row in np.flatnonzero(lengths > field_width)]
+
+
+def _integer_width_candidates(values, parsed_field_format, base):
+    # Largest positive and negative values that fit, the sign takes one character
+    width = int(parsed_field_format.width)
+    positive_digits = width - 1 if parsed_field_format.sign == "+" else width
+    largest = base ** positive_digits - 1
+    smallest = -(base ** (width - 1) - 1)
+    candidates = np.zeros(values.shape, dtype=bool)
+    # Limits outside of the range of the array type cannot be exceeded
+    if values.dtype.kind == "f" or largest <= np.iinfo(values.dtype).max:
+        candidates |= values > largest
+    if values.dtype.kind == "f" or smallest >= np.iinfo(values.dtype).min:
+        candidates |= values < smallest
+    return candidates
+
+
+def _fixed_point_width_candidates(values, parsed_field_format):
+    # Number of characters left for the integer part, one is taken by the decimal point and one by the sign
+    width = int(parsed_field_format.width)
+    precision = int(parsed_field_format.precision) if parsed_field_format.precision != -1 else 6
+    positive_digits = width - precision - 1 - (1 if parsed_field_format.sign == "+" else 0)
+    negative_digits = width - precision - 2
+    # Values that once rounded to the precision could need one more digit are also candidates
+    rounding = 10.0 ** -precision
+    candidates = values >= _power_of_ten(positive_digits) - rounding
+    candidates |= values <= -(_power_of_ten(negative_digits) - rounding)
+    return candidates
+
+
+def _exponential_width_candidates(values, parsed_field_format):
+    # d.ddde+XX takes precision + 6 characters, plus one for the sign and one more for three digit exponents
+    width = int(parsed_field_format.width)
+    precision = int(parsed_field_format.precision) if parsed_field_format.precision != -1 else 6
+    signed = parsed_field_format.sign == "+"
+    absolute_values = np.abs(values)
+    long_exponent = (absolute_values >= 9.0e99) | ((absolute_values < 1.0e-99) & (values != 0))
+    formatted_widths = precision + 6 + ((values < 0) | signed) + long_exponent
+    return (formatted_widths > width) | long_exponent
+
+
+def _power_of_ten(exponent):
+    # At least one digit is always written for the integer part, so with no room for digits nothing fits
+    if exponent <= 0:
+        return 0.0
+    return math.inf if exponent > 308 else 10.0 ** exponent
+
+
+def _compile_field_check(compiled_format, field_index):
+    parsed_field_format = compiled_format.parsed_field_formats[field_index]
+    data_type = compiled_format.data_types[field_index]
+    specifier = parsed_field_format.specifier
+    if specifier == "s":
+        return _StringCheck(compiled_format, field_index)
+    if data_type in INTEGER_DATA_TYPES and specifier not in _INTEGER_SPECIFIERS or \
+            data_type in REAL_DATA_TYPES and specifier not in _REAL_SPECIFIERS:
+        # The violation does not depend on the values, it is found by the columnar checks
+        return _FieldCheck(compiled_format, field_index)
+    if specifier in _INTEGER_SPECIFIERS:
+        width = int(parsed_field_format.width)
+        base = _INTEGER_SPECIFIERS[specifier]
+        positive_digits = width - 1 if parsed_field_format.sign == "+" else width
+        lower = -1 if data_type == "ASCII_NonNegative_Integer" else -base ** (width - 1)
+        return _NumberCheck(compiled_format, field_index, lower, base ** positive_digits)
+    if specifier == "f":
+        width = int(parsed_field_format.width)
+        precision = int(parsed_field_format.precision) if parsed_field_format.precision != -1 else 6
+        positive_digits = width - precision - 1 - (1 if parsed_field_format.sign == "+" else 0)
+        negative_digits = width - precision - 2
+        rounding = 10.0 ** -precision
+        return _NumberCheck(compiled_format, field_index, -(_power_of_ten(negative_digits) - rounding),
+                            _power_of_ten(positive_digits) - rounding)
+    return _ExponentialCheck(compiled_format, field_index)
+
+
+class _FieldCheck:
+    """Checks of the values of a field given one at a time, used to validate single records. accepts(value) is a quick
+    test passed by most valid values, and violations(value, row) returns the Violation that _validate_column finds for
+    the value. This base class accepts no value and checks every value as a column of one value."""
+
+    def __init__(self, compiled_format, field_index):
+        self._compiled_format = compiled_format
+        self._field_index = field_index
+        self.field_name = compiled_format.field_names[field_index]
+        self.field_format = compiled_format.field_formats[field_index]
+        self.field_width = compiled_format.field_widths[field_index]
+
+    def accepts(self, value):
+        return False
+
+    def violations(self, value, row):
+        return [violation if violation.row is None else violation._replace(row=row)
+                for violation in _validate_column(self._compiled_format, self._field_index, [value])]
+
+
+class _StringCheck(_FieldCheck):
+    def __init__(self, compiled_format, field_index):
+        super().__init__(compiled_format, field_index)
+        # Strings with precision are truncated to the width so they always fit
+        self._truncated = compiled_format.parsed_field_formats[field_index].precision != -1
+
+    def accepts(self, value):
+        return type(value) is str and (self._truncated or len(value) <= self.field_width)
+
+    def violations(self, value, row):
+        if type(value) is not str:
+            return super().violations(value, row)
+        if self.accepts(value):
+            return []
+        return [Violation(row, self.field_name, "value %r is longer than the width of the field which is %d" %
+                          (value, self.field_width))]
+
+
+class _NumberCheck(_FieldCheck):
+    """Checks of a numeric field. Values strictly between lower and upper fit in the field without formatting them."""
+
+    def __init__(self, compiled_format, field_index, lower, upper):
+        super().__init__(compiled_format, field_index)
+        self._lower = lower
+        self._upper = upper
+        specifier = compiled_format.parsed_field_formats[field_index].specifier
+        self._integer = specifier in _INTEGER_SPECIFIERS
+        self._strict_integer = specifier in _STRICT_INTEGER_SPECIFIERS
+        self._non_negative = compiled_format.data_types[field_index] == "ASCII_NonNegative_Integer"
+        # Floats are integers only after checking them in detail
+        self._accepted_types = (int,) if self._integer else (int, float)
+
+    def accepts(self, value):
+        return type(value) in self._accepted_types and self._lower < value < self._upper
+
+    def violations(self, value, row):
+        if type(value) not in _SCALAR_TYPES:
+            return super().violations(value, row)
+        if type(value) is float:
+            if self._strict_integer:
+                return [Violation(None, self.field_name, "values of type float cannot be formatted with %s" %
+                                  self.field_format)]
+            if not math.isfinite(value):
+                return [Violation(row, self.field_name, "value is %r" % value)]
+        violations = []
+        if self._integer and value != math.floor(value):
+            violations.append(Violation(row, self.field_name, "value %r is not an integer" % value))
+        if self._non_negative and value < 0:
+            violations.append(Violation(row, self.field_name, "value %r is negative" % value))
+        if not self._fits_without_formatting(value):
+            try:
+                formatted_field = self.field_format % value
+            except OverflowError:
+                # Integers too large to be converted to float
+                violations.append(Violation(row, self.field_name, "value %d is too large to be formatted with %s" %
+                                            (value, self.field_format)))
+            else:
+                if len(formatted_field) > self.field_width:
+                    violations.append(Violation(row, self.field_name, "value %s is wider than the width of the field "
+                                                "which is %d" % (formatted_field, self.field_width)))
+        return violations
+
+    def _fits_without_formatting(self, value):
+        return self._lower < value < self._upper
+
+
+class _ExponentialCheck(_NumberCheck):
+    """Checks of a field in exponential notation, whose width only depends on the sign and the exponent"""
+
+    def __init__(self, compiled_format, field_index):
+        super().__init__(compiled_format, field_index, None, None)
+        parsed_field_format = compiled_format.parsed_field_formats[field_index]
+        width = int(parsed_field_format.width)
+        precision = int(parsed_field_format.precision) if parsed_field_format.precision != -1 else 6
+        # d.ddde+XX takes precision + 6 characters, plus one for the sign
+        self._positive_fits = precision + 6 + (1 if parsed_field_format.sign == "+" else 0) <= width
+        self._negative_fits = precision + 7 <= width
+
+    def accepts(self, value):
+        return type(value) in self._accepted_types and self._fits_without_formatting(value)
+
+    def _fits_without_formatting(self, value):
+        # Exponents of three digits are one character wider
+        magnitude = abs(value)
+        if not (magnitude < 9.0e99 and (magnitude >= 1.0e-99 or value == 0)):
+            return False
+        return self._positive_fits if value >= 0 else self._negative_fits
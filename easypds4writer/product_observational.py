@@ -8,7 +8,43 @@ import xml.etree.ElementTree as ET
 import ntpath
 import datetime
 import os
+import re
+import copy
+import hashlib
+import json
+import time
+import warnings
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from easypds4writer.table_character import TableCharacter
+from easypds4writer.private.data_writer import BinaryDataWriter, DataSegment, HashingDataWriter, MappedDataFile, \
+    QueuedDataWriter
+from easypds4writer.private import template_cache
+from easypds4writer.private.label_template import PLACEHOLDER_PATTERN, indent
+from easypds4writer.private.label_writer import LabelWriter
+from easypds4writer.private.instrumentation import ProductStats
+
+# Default number of bytes a table keeps in memory in segmented mode before moving its data to a temporary file
+DEFAULT_SPILL_THRESHOLD = 32 * 1024 * 1024
+# Default size of the write buffer of the data file in binary mode
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+
+# Extension added to the data file name to get the name of its checkpoint file
+CHECKPOINT_EXTENSION = ".checkpoint"
+
+# Description of one product to be written by ProductObservational.write_products.
+#   data_file_name: name of the data file of the product, possibly with a path.
+#   metadata: dictionary of variables and values as would be given to set_metadata.
+#   records: one record source per declared table, in the order the tables were declared. A record source is an
+#            iterable of records or a callable returning one, which is called in the worker process (e.g. to read or
+#            generate the records there instead of sending them from the parent process). Jobs are sent to the workers
+#            with pickle, so record sources must be picklable: lists or arrays of records, or callables defined at
+#            the top level of a module (or functools.partial of them), but not generators or lambdas.
+ProductJob = namedtuple("ProductJob", "data_file_name metadata records")
+
+# Outcome of one product written by ProductObservational.write_products. error is None if the product was written
+# successfully and otherwise the exception that stopped it, in which case label_file_name is None.
+ProductResult = namedtuple("ProductResult", "data_file_name label_file_name error")
 
 
 class ProductObservational:
@@ -20,24 +56,67 @@ class ProductObservational:
       shall not be reconfigured however to write a different product type. All products sharing the same format and
       label template are of the same type.
       Methods:
-        __init__(self, template_name):          Initialize the object, optionally with a template.
+        __init__(self, template_name, ...):     Initialize the object, optionally with a template. The optional
+                                                arguments selecting how the data file is written are described in
+                                                __init__.
         declare_table_character(self, name=""): Tells the object that this product type will contain a fixed width ASCII
                                                 table (a PDS4 Table_Character) with the given name.
-        new_product(self, data_file_name):      Initializes a new product product receiving as argument the data file
-                                                name (not the label name).
-
-        set_metadata(self, variable, value):    A template engine used to replace one string by another in the template.
+        new_product(self, data_file_name, resume=False, preallocated_records=None):
+                                                Initializes a new product product receiving as argument the data file
+                                                name (not the label name). If resume is True it continues the product
+                                                from its last checkpoint instead. If the number of records of each
+                                                table is known, the data file can be preallocated and mapped in memory.
+        checkpoint(self):                       Saves the state of the product being written so it can be resumed.
+        stats:                                  Statistics of the product being written or last written, if they
+                                                are collected.
+
+        set_metadata(self, variable, value):    A template engine used to replace a $variable in the template by a value.
         close_product(self):                    Writes the product (data file and label file) and leaves the object
                                                 ready to call new_product again.
+        write_products(self, jobs, workers=None):
+                                                Writes many products of this type in parallel in a pool of processes.
     """
 
-    def __init__(self, template_name):
+    def __init__(self, template_name, segmented_tables=False, spill_threshold=DEFAULT_SPILL_THRESHOLD, binary=False,
+                 buffer_size=DEFAULT_BUFFER_SIZE, reload_template=False, write_queue_size=0,
+                 checkpoint_interval=None, collect_stats=False, stats_callback=None, checksum=False,
+                 checksum_thread=False):
         """"
         Initialization method
 
         Arguments:
             template_name: String consisting on a template name possibly with a path. products
+            segmented_tables: If True each declared table writes its records to its own segment instead of directly
+                              to the data file, so tables can be filled in any order or interleaved. The segments
+                              are copied to the data file one after the other by close_product.
+            spill_threshold: In segmented mode, number of bytes a table keeps in memory before moving its records to
+                             a temporary file.
+            binary: If True the data file is opened in binary mode. Records are encoded as ASCII once, CR LF line
+                    endings are written explicitly and offsets are counted instead of asked to the file, which is
+                    much faster than the default text mode for large tables. Values must be ASCII.
+            buffer_size: In binary mode, size in bytes of the write buffer of the data file.
+            write_queue_size: In binary mode, if greater than 0 the data file is written by a dedicated thread. The
+                              records are handed to it through a queue of up to this number of blocks, and writing
+                              records blocks only when the queue is full.
+            reload_template: The template is parsed once, the first time a product is created, and every product
+                             starts from a copy of it. If True new_product checks whether the template file was
+                             modified since and if so parses it again.
+            checkpoint_interval: If given, number of seconds between automatic checkpoints of the product being
+                                 written (see checkpoint). Not supported in segmented mode.
+            collect_stats: If True the rows and bytes written to each table and the time spent validating, formatting
+                           and writing them, as well as the time of each phase of new_product and close_product
+                           (template, data file, label generation, metadata replacement and label writing), are
+                           collected in a ProductStats per product available in the stats attribute.
+            stats_callback: Callable that receives the ProductStats of each product when close_product finishes it.
+                            Giving it implies collect_stats.
+            checksum: If True the MD5 checksum and the size of the data file are computed while it is written and
+                      given in the label (md5_checksum and file_size of the File element). The data file is then
+                      written in binary mode.
+            checksum_thread: If True the checksum is computed by a dedicated thread instead of by the thread writing
+                             the records. With write_queue_size it is always computed by the writing thread.
         """
+        if segmented_tables and checkpoint_interval:
+            raise PDS4meInputError(checkpoint_interval, "checkpoints are not supported with segmented tables")
 
         # Attributes which take always the same values for every product of the same type.
 
@@ -45,35 +124,122 @@ class ProductObservational:
         self._template_name = template_name
         # Holds the pds4 objects (table character, image etc) that are in the definition of this product type.
         self._list_of_objects= []
+        self._segmented_tables = segmented_tables
+        self._spill_threshold = spill_threshold
+        self._binary = binary
+        self._buffer_size = buffer_size
+        self._write_queue_size = write_queue_size
+        self._checkpoint_interval = checkpoint_interval
+        self._collect_stats = collect_stats or stats_callback is not None
+        self._stats_callback = stats_callback
+        self._checksum = checksum
+        self._checksum_thread = checksum_thread
+        # CompiledTemplate taken from the template cache the first time it is needed. It must not be modified.
+        self._template = None
+        self._reload_template = reload_template
 
         # Attributes which values are specific of each product
 
-        # Contains the root of the ETREE object containing a parsed representation of the label
-        self.label = None
+        # Contains the root of the ETREE object containing a parsed representation of the label. It is only built
+        # if the label attribute is accessed, otherwise the label is rendered from the compiled template.
+        self._label = None
         self._data_file_name = ""
         self._product_name = ""
         self._label_file_name = ""
         # File pointer to the data file as returned by python open method
         self._fp_data_file= None
+        # In segmented mode, DataSegment of each pds4 object in the same order as _list_of_objects
+        self._data_segments = []
+        # Number of records of each pds4 object if the data file of the product was preallocated, otherwise None
+        self._preallocated_records = None
         # Dictionary (understood as the Python data structure) to hold pairs of variables and values introduced by
         # the user.
         self._metadata = {}
+        # Variables of the last product and the compiled regular expression that matches any of them
+        self._metadata_pattern = None
+        # HashingDataWriter computing the checksum of the data file as it is written, if any
+        self._hashing_writer = None
+        # (file_size, md5_checksum) of the data file, computed by close_product before writing the label
+        self._data_file_checksum = None
+        # ProductStats of the product being written (or the last one) if statistics are collected, otherwise None
+        self._stats = None
+        # time.monotonic() value after which the next automatic checkpoint is saved
+        self._next_checkpoint_time = 0
+
+    def new_product(self, data_file_name, resume=False, preallocated_records=None):
+        """"
+        Initializes a new product
 
-    def new_product(self, data_file_name):
+        Arguments:
+            data_file_name: Name of the data file of the product, possibly with a path.
+            resume: If True and the data file has a checkpoint (see checkpoint), the product is not started again but
+                    continued from the checkpoint: the data file is truncated after the last record the checkpoint
+                    accounts for, the tables continue from that record and the metadata set is restored. If there is
+                    no checkpoint a new product is started as usual.
+            preallocated_records: Sequence with the number of records of each declared object, in the order they were
+                                  declared. If given, the data file is created with its final size and mapped in
+                                  memory, and every record has its place at offset + i * record_length. Records can
+                                  then be written in any order, also from several threads, with write_records_at as
+                                  well as with the usual methods, which fill the table from its first row. Every
+                                  preallocated record must be written before close_product.
+        """
+        if resume and self._segmented_tables:
+            raise PDS4meInputError(data_file_name, "products with segmented tables cannot be resumed")
+        if preallocated_records is not None:
+            if self._segmented_tables or self._checkpoint_interval or resume:
+                raise PDS4meInputError(preallocated_records, "preallocated records cannot be used with segmented "
+                                                             "tables, checkpoints or resume")
+            if len(preallocated_records) != len(self._list_of_objects):
+                error_message = "%d numbers of records were given but the product has %d objects" % \
+                                (len(preallocated_records), len(self._list_of_objects))
+                raise PDS4meInputError(preallocated_records, error_message)
+            preallocated_records = list(preallocated_records)
+        self._preallocated_records = preallocated_records
+        if self._collect_stats:
+            self._stats = ProductStats(data_file_name, [pds4_object._name for pds4_object in self._list_of_objects])
 
         self._data_file_name = data_file_name
         self._product_name = os.path.splitext(data_file_name)[0]
 
         self._label_file_name = self._product_name + ".xml"
+        checkpoint = self._read_checkpoint() if resume else None
         # Dictionary (understood as the Python data structure) to hold pairs of variables and values introduced by
         # the user.
-        self._metadata = {}
+        self._metadata = dict(checkpoint["metadata"]) if checkpoint else {}
+        start = time.perf_counter()
         self._initialize_label()
-        self._open_files()
-        # Loop on ech PDS4 object declared in this product and reset their attributes and set on them the file pointer.
-        for pds4_object in self._list_of_objects:
+        self._add_phase_time("template", start)
+        # Loop on ech PDS4 object declared in this product and reset their attributes. The state of a resumed product
+        # is restored (and checked) before its data file is truncated.
+        for index, pds4_object in enumerate(self._list_of_objects):
             pds4_object.reset()
-            pds4_object.set_file_pointers(self._fp_data_file)
+            if checkpoint:
+                pds4_object._restore_checkpoint_state(checkpoint["objects"][index])
+        start = time.perf_counter()
+        self._open_files(checkpoint["data_size"] if checkpoint else None)
+        self._add_phase_time("open", start)
+        # Set on each object the file pointer. In segmented mode each object gets its own segment instead of the data
+        # file. Segments left by a product that was not closed (e.g. after an error) are discarded.
+        for data_segment in self._data_segments:
+            data_segment.close()
+        self._data_segments = []
+        offset = 0
+        for index, pds4_object in enumerate(self._list_of_objects):
+            pds4_object._stats = self._stats.tables[index] if self._stats is not None else None
+            if self._segmented_tables:
+                data_segment = DataSegment(self._spill_threshold)
+                self._data_segments.append(data_segment)
+                pds4_object.set_file_pointers(data_segment)
+            elif preallocated_records is not None:
+                size = pds4_object._preallocated_size(preallocated_records[index])
+                record_length = pds4_object._preallocated_size(1)
+                pds4_object.set_file_pointers(self._fp_data_file.region(offset, size, record_length))
+                offset += size
+            else:
+                pds4_object.set_file_pointers(self._fp_data_file)
+            pds4_object._after_write = self._checkpoint_if_due if self._checkpoint_interval else None
+        if self._checkpoint_interval:
+            self._next_checkpoint_time = time.monotonic() + self._checkpoint_interval
 
     def declare_table_character(self, name=""):
         # TODO Check that table_character is actually of table_character type
@@ -81,91 +247,353 @@ class ProductObservational:
         self._append_object(table_character)
         return table_character
 
+    @property
+    def stats(self):
+        """ProductStats of the product being written, or of the last product written, or None if statistics are not
+        collected"""
+        return self._stats
+
+    @property
+    def label(self):
+        # The first time the label of a product is accessed it is built as a copy of the template, which can then be
+        # modified. Such labels are written by serializing the whole tree.
+        if self._label is None and self._label_file_name:
+            self._label = copy.deepcopy(self._template.root)
+        return self._label
+
+    @label.setter
+    def label(self, label):
+        self._label = label
+
     def set_metadata(self, variable, value):
-        """" TBW """
-        if (variable[0] != '$'):
-            error_message = "variables must start with $ but %s does not" % (variable)
+        """"
+        Sets the value that will replace the variable (a placeholder such as $start_time) in the label
+
+        Variables are a $ followed by letters, digits and underscores, not starting with a digit. They can be used in
+        the template and in the name, unit and description of the declared fields. Raises PDS4meInputError if the
+        variable is not valid or it is not used in the label.
+        """
+        if PLACEHOLDER_PATTERN.fullmatch(variable) is None:
+            error_message = "variables must be a $ followed by letters, digits and underscores, not starting with a " \
+                            "digit, but %s is not" % (variable)
+            raise PDS4meInputError(variable, error_message)
+        if self._template is None:
+            self._load_template()
+        if variable not in self._template.placeholders and variable not in self._label_placeholders():
+            error_message = "variable %s is not used in the template %s nor in the declared fields" % \
+                            (variable, self._template_name)
             raise PDS4meInputError(variable, error_message)
         self._metadata[variable]= value
 
+    def checkpoint(self):
+        """"
+        Saves the state of the product being written so it can be continued with new_product(..., resume=True) if the
+        process is interrupted
+
+        The records written so far are flushed to the data file and the number of records, offset and record length
+        of each table, the size of the data file they take and the metadata set are saved in a checkpoint file next to
+        the data file (the data file name followed by .checkpoint). The data file is synchronized to disk before the
+        checkpoint file is replaced atomically, so a checkpoint never accounts for records that were lost. The
+        checkpoint file is removed by close_product.
+        """
+        if self._segmented_tables or self._preallocated_records is not None:
+            raise PDS4meInputError(self._data_file_name, "checkpoints are not supported with segmented tables or "
+                                                         "preallocated records")
+        self._fp_data_file.flush()
+        os.fsync(self._fp_data_file.fileno())
+        # Only the complete records accounted for by the objects are saved, the data after them will be truncated
+        ends_of_data = [pds4_object._end_of_data() for pds4_object in self._list_of_objects]
+        checkpoint = {"data_size": max([end for end in ends_of_data if end is not None], default=0),
+                      "metadata": self._metadata,
+                      "objects": [pds4_object._checkpoint_state() for pds4_object in self._list_of_objects]}
+        checkpoint_file_name = self._data_file_name + CHECKPOINT_EXTENSION
+        temporary_checkpoint_file_name = checkpoint_file_name + ".tmp"
+        with open(temporary_checkpoint_file_name, "w") as fp_checkpoint_file:
+            json.dump(checkpoint, fp_checkpoint_file)
+            fp_checkpoint_file.flush()
+            os.fsync(fp_checkpoint_file.fileno())
+        os.replace(temporary_checkpoint_file_name, checkpoint_file_name)
+        if self._checkpoint_interval:
+            self._next_checkpoint_time = time.monotonic() + self._checkpoint_interval
+
     def close_product(self):
+        # In segmented mode the data file is written now, which also gives the final offset of each object
+        if self._segmented_tables:
+            start = time.perf_counter()
+            self._write_data_segments()
+            self._add_phase_time("segments", start)
+        # Preallocated records are all in the label, so check that they were written
+        if self._preallocated_records is not None:
+            self._set_preallocated_records()
+        # In segmented mode the checksum was computed while copying the segments
+        if self._checksum and not self._segmented_tables:
+            self._data_file_checksum = self._compute_data_file_checksum()
+        elif isinstance(self._fp_data_file, QueuedDataWriter):
+            # Wait until the queued records are written, so an error writing them is raised before writing the label
+            self._fp_data_file.flush()
         # Generate and write to file the label
         self._write_label()
-        # Close file and reset other variables to ensure that if the method is called again by accident it fails.
+        # Report the placeholders of the label for which no value was given
+        unset_variables = [variable for variable in self._label_placeholders() if variable not in self._metadata]
+        if unset_variables:
+            warnings.warn("The following variables of the template were not set in the label %s: %s" %
+                          (self._label_file_name, ", ".join(unset_variables)))
+        # Close the data file
+        if (self._fp_data_file != None):
+            self._fp_data_file.close()
+        # The product is complete so it will not be resumed
+        checkpoint_file_name = self._data_file_name + CHECKPOINT_EXTENSION
+        if os.path.exists(checkpoint_file_name):
+            os.remove(checkpoint_file_name)
+        # Reset other variables to ensure that if the method is called again by accident it fails.
         self.label = None
         self._data_file_name= None
         self._label_file_name = None
         self._product_name= None
-        # Close the data file
-        if (self._fp_data_file != None):
-            self._fp_data_file.close()
+        self._hashing_writer = None
+        self._data_file_checksum = None
+        if self._stats_callback is not None:
+            self._stats_callback(self._stats)
+
+    def write_products(self, jobs, workers=None):
+        """"
+        Writes many products of this type in parallel in a pool of processes
+
+        The product type (parsed template and declared objects) is sent once to each worker process which then
+        writes the products assigned to it, so all products are written as if new_product, set_metadata, add_record
+        and close_product were called for each of them. It must not be called while a product is being written.
+
+        Arguments:
+            jobs: iterable of ProductJob (or tuples with the same fields), one per product.
+            workers: Maximum number of worker processes. By default the number of processors of the machine.
+        Return: List of ProductResult in the same order as jobs. Errors in one product do not stop the others, including
+                errors sending the job to a worker (e.g. a record source that cannot be pickled).
+        """
+        # Copy the product type with the template already parsed so the workers do not have to read it
+        product_type = copy.copy(self)
+        product_type._template = template_cache.get_template(self._template_name)
+        product_type._reload_template = False
+
+        jobs = [ProductJob(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker,
+                                 initargs=(product_type,)) as executor:
+            futures = [executor.submit(_write_product_in_worker, job) for job in jobs]
+            results = []
+            for job, future in zip(jobs, futures):
+                # Errors in the worker are already returned as results, the future only fails if the job or its
+                # result could not be sent (pickled) or the worker process died
+                try:
+                    results.append(future.result())
+                except Exception as error:
+                    results.append(ProductResult(job.data_file_name, None, error))
+            return results
+
+    def __getstate__(self):
+        # Only the definition of the product type is copied or pickled, not the product being written (if any)
+        state = self.__dict__.copy()
+        state["_label"] = None
+        state["_fp_data_file"] = None
+        state["_data_segments"] = []
+        state["_stats"] = None
+        state["_hashing_writer"] = None
+        return state
+
+    def _discard_product(self):
+        # Closes the files of a product that could not be completed and leaves the object ready to call new_product
+        if self._fp_data_file is not None:
+            try:
+                self._fp_data_file.close()
+            except Exception:
+                # An error of a write queue is raised again, but it was already raised to the caller
+                pass
+            self._fp_data_file = None
+        for data_segment in self._data_segments:
+            data_segment.close()
+        self._data_segments = []
+        self._preallocated_records = None
+        self._hashing_writer = None
+        self.label = None
+
+    def _label_placeholders(self):
+        # Variables of the template followed by those in the parts of the label written by the objects
+        placeholders = list(self._template.placeholders)
+        for pds4_object in self._list_of_objects:
+            placeholders.extend(variable for variable in pds4_object._label_placeholders()
+                                if variable not in placeholders)
+        return placeholders
 
     def _append_object(self, pds4_object):
         #pds4_object.set_file_pointers(self._fp_data_file)
         #pds4_object.offset= self._fp_data_file.tell()
         self._list_of_objects.append(pds4_object)
 
-    def _open_files(self):
+    def _open_files(self, resumed_data_size=None):
         # Missing to implement I/O error handling and possibly handling the cases where the product name is given
         # (by error) with an extension
         # Pending to handle right data file extension.
+        # In segmented mode the data file is only opened by close_product
+        if self._segmented_tables:
+            self._fp_data_file = None
+            return
+        # A preallocated data file is created with its final size and mapped in memory
+        if self._preallocated_records is not None:
+            data_size = sum(pds4_object._preallocated_size(records)
+                            for pds4_object, records in zip(self._list_of_objects, self._preallocated_records))
+            self._fp_data_file = MappedDataFile(self._data_file_name, data_size)
+            return
+        # A resumed product keeps the data file up to the size given by its checkpoint and continues writing after it
+        append = resumed_data_size is not None
+        if append:
+            # Truncating a shorter file would fill it with zero bytes that the label would count as records
+            data_size = os.path.getsize(self._data_file_name)
+            if data_size < resumed_data_size:
+                error_message = "the data file %s has %d bytes but its checkpoint accounts for %d, it cannot be " \
+                                "resumed" % (self._data_file_name, data_size, resumed_data_size)
+                raise PDS4meInputError(self._data_file_name, error_message)
+            os.truncate(self._data_file_name, resumed_data_size)
+        if self._binary or self._checksum:
+            self._fp_data_file = BinaryDataWriter(self._data_file_name, self._buffer_size, append)
+            if self._checksum:
+                # With a write queue the writing thread is already a background thread
+                background = self._checksum_thread and self._write_queue_size == 0
+                self._hashing_writer = HashingDataWriter(self._fp_data_file, background)
+                if append:
+                    self._hashing_writer.hash_existing_data(self._data_file_name, resumed_data_size)
+                self._fp_data_file = self._hashing_writer
+            if self._write_queue_size > 0:
+                self._fp_data_file = QueuedDataWriter(self._fp_data_file, self._write_queue_size)
+            return
         # newline='\r\n' forces line ending in CR LF in both Linux and Windows. It should work in Python 3.x and > 2.6
-        self._fp_data_file = open(self._data_file_name, "w", newline='\r\n')
+        self._fp_data_file = open(self._data_file_name, "a" if append else "w", newline='\r\n')
+
+    def _read_checkpoint(self):
+        # Returns the checkpoint saved for the data file, or None if there is none
+        checkpoint_file_name = self._data_file_name + CHECKPOINT_EXTENSION
+        if not os.path.exists(checkpoint_file_name):
+            return None
+        with open(checkpoint_file_name) as fp_checkpoint_file:
+            checkpoint = json.load(fp_checkpoint_file)
+        if len(checkpoint["objects"]) != len(self._list_of_objects):
+            error_message = "the checkpoint %s has %d objects but the product has %d" % \
+                            (checkpoint_file_name, len(checkpoint["objects"]), len(self._list_of_objects))
+            raise PDS4meInputError(checkpoint_file_name, error_message)
+        return checkpoint
+
+    def _checkpoint_if_due(self):
+        # Called by the objects after writing records when automatic checkpoints are enabled
+        if time.monotonic() >= self._next_checkpoint_time:
+            self.checkpoint()
+
+    def _write_data_segments(self):
+        # Copy the segments to the data file one after the other in the order the objects were declared. The data
+        # file is unbuffered so the segments stored in temporary files can be copied by the kernel.
+        offset = 0
+        md5 = hashlib.md5() if self._checksum else None
+        with open(self._data_file_name, "wb", buffering=0) as fp_data_file:
+            for pds4_object, data_segment in zip(self._list_of_objects, self._data_segments):
+                pds4_object._offset = offset
+                data_segment.copy_to(fp_data_file, md5)
+                offset += data_segment.tell()
+                data_segment.close()
+        self._data_segments = []
+        if md5 is not None:
+            self._data_file_checksum = (offset, md5.hexdigest())
+
+    def _compute_data_file_checksum(self):
+        # Returns the size and the MD5 checksum of the data file once all the records are written
+        if isinstance(self._fp_data_file, MappedDataFile):
+            return self._fp_data_file.size, self._fp_data_file.hexdigest()
+        # Wait until any queued records are written (and hashed)
+        self._fp_data_file.flush()
+        return self._fp_data_file.tell(), self._hashing_writer.hexdigest()
+
+    def _set_preallocated_records(self):
+        # Gives to each object its preallocated records, as if they were written in order, and warns if any of them
+        # was not written
+        offset = 0
+        for pds4_object, records in zip(self._list_of_objects, self._preallocated_records):
+            region = pds4_object._fp_data_file
+            pds4_object._set_preallocated_records(offset, records)
+            if region.records_written() < records:
+                warnings.warn("Not all the %d records preallocated for the object %s in %s were written, the rest are "
+                              "filled with zero bytes" % (records, pds4_object._name, self._data_file_name))
+            offset += region.size
+        self._preallocated_records = None
 
     def _initialize_label(self):
-        tree = ET.parse(self._template_name)
-        # This is done to register a namespace so that the default namespace ns0: does not appear before all XML tags
-        ET.register_namespace('', "http://pds.nasa.gov/pds4/pds/v1")
+        # The template is parsed and compiled (and its namespace registered) only the first time or, if requested,
+        # when the file changed.
+        if self._template is None or self._reload_template:
+            self._load_template()
+        self._label = None
+
+    def _load_template(self):
         #ET.register_namespace('psa', "http://psa.esa.int/psa/v1")
 
         #self._register_all_namespaces(self._template_name)
 
-        self.label = tree.getroot()
+        self._template = template_cache.get_template(self._template_name)
 
     def _write_label(self):
+        start = time.perf_counter()
 
-        file_area_observational= ET.Element("File_Area_Observational")
-        self.label.append(file_area_observational)
-
-        file = ET.SubElement(file_area_observational, "File")
-
-        file_name = ET.SubElement(file, "file_name")
-        file_name.text = ntpath.basename(self._data_file_name)
+        # The File_Area_Observational is written directly as text, indented as a child of the root of the label
+        label_writer = LabelWriter(level=1)
+        label_writer.start("File_Area_Observational")
 
-        creation_date_time = ET.SubElement(file, "creation_date_time")
-        creation_date_time.text = datetime.datetime.utcnow().isoformat() + "Z"
-
-        comment = ET.SubElement(file, "comment")
-        comment.text = "This product, including its data file and the label file have been generated using EasyPDS4writer library draft version"
+        label_writer.start("File")
+        label_writer.element("file_name", ntpath.basename(self._data_file_name))
+        label_writer.element("creation_date_time", datetime.datetime.utcnow().isoformat() + "Z")
+        if self._data_file_checksum is not None:
+            label_writer.element("file_size", str(self._data_file_checksum[0]), unit="byte")
+            label_writer.element("md5_checksum", self._data_file_checksum[1])
+        label_writer.element("comment", "This product, including its data file and the label file have been generated using EasyPDS4writer library draft version")
+        label_writer.end()
 
         # Loop on ech PDS4 object. Each object is responsible of writing its own part of the label
         for pds4_object in self._list_of_objects:
-            pds4_object.writte_label(file_area_observational, ET)
-
-        # wrap it in an ElementTree instance, and save as XML
-        tree = ET.ElementTree(self.label)
-        self._indent(self.label,0)
-        tree.write(self._label_file_name)
-
-        # Now that the label has been written and closed, reopen it to edit the variables 9placeholders) and replace
-        # them with the user provided values.
-        self._replace_metadata_in_label()
-
-
-    def _indent(self, elem, level=0):
-        i = "\n" + level*"    "
-        if len(elem):
-            if not elem.text or not elem.text.strip():
-                elem.text = i + "    "
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
-            for elem in elem:
-                self._indent(elem, level+1)
-            if not elem.tail or not elem.tail.strip():
-                elem.tail = i
+            pds4_object.write_label(label_writer)
+
+        label_writer.end()
+        file_area_in_a_string = label_writer.getvalue()
+
+        # Replace the variables (placeholders) with the user provided values before writing the label, so the label
+        # file is written only once.
+        if self._label is None:
+            # The rest of the label comes from the compiled template
+            self._add_phase_time("label", start)
+            start = time.perf_counter()
+            file_area_in_a_string = self._replace_metadata_in_label(file_area_in_a_string)
+            self._add_phase_time("metadata", start)
+            start = time.perf_counter()
+            label_in_a_string = self._template.render(self._metadata, file_area_in_a_string)
+            self._add_phase_time("label", start)
         else:
-            if level and (not elem.tail or not elem.tail.strip()):
-                elem.tail = i
+            # The label was accessed and possibly modified so the whole tree is serialized as ElementTree.write would
+            # do it
+            self._label.append(ET.fromstring(file_area_in_a_string))
+            indent(self._label, 0)
+            label_in_a_string = ET.tostring(self._label, encoding="us-ascii").decode("ascii")
+            self._add_phase_time("label", start)
+            start = time.perf_counter()
+            label_in_a_string = self._replace_metadata_in_label(label_in_a_string)
+            self._add_phase_time("metadata", start)
+
+        # Write the label to a temporary file and then rename it so the label file is never left half written
+        start = time.perf_counter()
+        temporary_label_file_name = self._label_file_name + ".tmp"
+        with open(temporary_label_file_name, "w") as fp_label_file_local:
+            fp_label_file_local.write(label_in_a_string)
+        os.replace(temporary_label_file_name, self._label_file_name)
+        self._add_phase_time("label_write", start)
+        if self._stats is not None:
+            self._stats.label_bytes = len(label_in_a_string)
+
+    def _add_phase_time(self, phase, start):
+        # Adds to the statistics of the product the time elapsed since start, if statistics are collected
+        if self._stats is not None:
+            self._stats.add_phase_time(phase, start)
+
 
     def _register_all_namespaces(self, filename):
         """" Register the namespaces
@@ -182,21 +610,46 @@ class ProductObservational:
             ET.register_namespace(ns, namespaces[ns])
 
 
-    def _replace_metadata_in_label(self):
-
-        # Open for reading and writing
-        fp_label_file_local = open(self._label_file_name, "r+")
-
-        # Read the label file to a string and replace in the string the variables with the values provided by the user
-        label_in_a_string= fp_label_file_local.read()
-        for variable, value in self._metadata.items():
-            label_in_a_string= label_in_a_string.replace(variable, value)
+    def _replace_metadata_in_label(self, label_in_a_string):
+        # Replace in the label all the variables with the values provided by the user in a single pass. Longer
+        # variables are tried first so a variable that is the beginning of another one does not replace part of it.
+        if not self._metadata:
+            return label_in_a_string
+        variables = tuple(sorted(self._metadata, key=len, reverse=True))
+        if self._metadata_pattern is None or self._metadata_pattern[0] != variables:
+            # Products of the same type usually set the same variables so the pattern is kept for the next product
+            self._metadata_pattern = (variables, re.compile("|".join(map(re.escape, variables))))
+        metadata = self._metadata
+        return self._metadata_pattern[1].sub(lambda match: metadata[match.group(0)], label_in_a_string)
+
+# ProductObservational used by a worker process of write_products. It is set once per process by _initialize_worker.
+_worker_product = None
+
+
+def _initialize_worker(product_type):
+    global _worker_product
+    _worker_product = product_type
+    # The template of the product type was parsed in the parent process, the namespace has to be registered here
+    ET.register_namespace('', template_cache.PDS4_NAMESPACE)
+
+
+def _write_product_in_worker(job):
+    product = _worker_product
+    try:
+        product.new_product(job.data_file_name)
+        label_file_name = product._label_file_name
+        for variable, value in job.metadata.items():
+            product.set_metadata(variable, value)
+        for pds4_object, records in zip(product._list_of_objects, job.records):
+            if callable(records):
+                records = records()
+            pds4_object.write_from(records)
+        product.close_product()
+    except Exception as error:
+        product._discard_product()
+        return ProductResult(job.data_file_name, None, error)
+    return ProductResult(job.data_file_name, label_file_name, None)
 
-        # Place the write file pointer to the beginning of the file, write the string containing the updated label and
-        # close the file.
-        fp_label_file_local.seek(0)
-        fp_label_file_local.write(label_in_a_string)
-        fp_label_file_local.close()
 
 class PDS4meInputError(Exception):
     """Exception raised for errors in the input.
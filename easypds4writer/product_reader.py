@@ -0,0 +1,192 @@
+"""
+ProductReader Module
+Public classes in the module:
+  ProductReader
+  TableCharacterReader
+"""
+import mmap
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import numpy as np
+
+from easypds4writer.private import template_cache
+from easypds4writer.product_observational import PDS4meInputError
+
+# Description of one field of a table as given by its Field_Character element. location counts from 0 (the
+# field_location of the label minus 1) and length is the field_length in bytes.
+FieldDescription = namedtuple("FieldDescription", "name location length data_type field_format")
+
+_NAMESPACE = "{%s}" % template_cache.PDS4_NAMESPACE
+
+# Base of the integers written with each integer specifier of field_format (0 is the PDS4 specifier of octal numbers)
+_INTEGER_BASES = {"d": 10, "x": 16, "0": 8}
+
+
+class ProductReader:
+    """"
+    ProductReader class: Reads back products written by ProductObservational.
+
+      The label is parsed to find the data file and the Table_Character objects it contains. The data file is mapped
+      in memory and each table is read through a TableCharacterReader that gives NumPy views of its records without
+      copying or parsing them. Only the columns that are asked for are decoded.
+      Methods:
+        __init__(self, label_file_name):        Parses the label and maps the data file in memory.
+        table(self, name_or_index):             Returns the TableCharacterReader of a table given its position or, if
+                                                the label gives one, its name.
+        close(self):                            Unmaps the data file. Arrays returned by the tables must be deleted
+                                                first (or copied) as they point to the mapped memory.
+      Attributes:
+        data_file_name:                         Name of the data file, with the path of the label.
+        tables:                                 List of TableCharacterReader in the order of the label.
+    """
+
+    def __init__(self, label_file_name):
+        label = ET.parse(label_file_name).getroot()
+        file_area = label.find(_NAMESPACE + "File_Area_Observational")
+        if file_area is None:
+            raise PDS4meInputError(label_file_name, "the label %s has no File_Area_Observational" % label_file_name)
+        file_name = file_area.findtext("%sFile/%sfile_name" % (_NAMESPACE, _NAMESPACE))
+        self.data_file_name = os.path.join(os.path.dirname(label_file_name), file_name)
+
+        self._fp_data_file = open(self.data_file_name, "rb")
+        # Empty files cannot be mapped, but then there are no records to read either
+        if os.fstat(self._fp_data_file.fileno()).st_size > 0:
+            self._map = mmap.mmap(self._fp_data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._map = b""
+        self.tables = [TableCharacterReader(table_element, self._map)
+                       for table_element in file_area.iter(_NAMESPACE + "Table_Character")]
+
+    def table(self, name_or_index):
+        if isinstance(name_or_index, int):
+            return self.tables[name_or_index]
+        for table in self.tables:
+            if table.name == name_or_index:
+                return table
+        raise PDS4meInputError(name_or_index, "there is no table %s in %s" % (name_or_index, self.data_file_name))
+
+    def close(self):
+        for table in self.tables:
+            table._release()
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._fp_data_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TableCharacterReader:
+    """"
+    TableCharacterReader class: Gives access to the records of one Table_Character of a product.
+
+      Every record has the same length so record i starts at offset + i * record_length, and every field is at the
+      same position in all the records. The records are therefore exposed as a NumPy structured array placed over the
+      mapped data file, with one bytes field per field of the table, so accessing a record or the raw values of a
+      column reads only the bytes needed.
+      Methods:
+        record(self, index):                    Returns record index as a tuple of decoded values.
+        raw_column(self, field):                Returns a view of the column (field name or position) as bytes values.
+        column(self, field):                    Returns the column decoded into integers, floats or strings.
+      Attributes:
+        name, offset, records, record_length:   As in the label.
+        fields:                                 List of FieldDescription, one per Field_Character.
+        rows:                                   Structured array view of the records, without the line endings.
+    """
+
+    def __init__(self, table_element, mapped_data_file):
+        self.name = table_element.findtext(_NAMESPACE + "name") or ""
+        self.offset = int(table_element.findtext(_NAMESPACE + "offset"))
+        self.records = int(table_element.findtext(_NAMESPACE + "records"))
+        record_character = table_element.find(_NAMESPACE + "Record_Character")
+        self.record_length = int(record_character.findtext(_NAMESPACE + "record_length"))
+        self.fields = [FieldDescription(field_element.findtext(_NAMESPACE + "name"),
+                                        int(field_element.findtext(_NAMESPACE + "field_location")) - 1,
+                                        int(field_element.findtext(_NAMESPACE + "field_length")),
+                                        field_element.findtext(_NAMESPACE + "data_type"),
+                                        field_element.findtext(_NAMESPACE + "field_format"))
+                       for field_element in record_character.iter(_NAMESPACE + "Field_Character")]
+
+        if self.records > 0 and self.offset + self.records * self.record_length > len(mapped_data_file):
+            error_message = "the table %s needs %d bytes from byte %d but the data file only has %d bytes" % \
+                            (self.name, self.records * self.record_length, self.offset, len(mapped_data_file))
+            raise PDS4meInputError(self.name, error_message)
+
+        # The record_length is the itemsize, so consecutive elements of the array are consecutive records. Tables
+        # without records have a record_length of 0 in the label.
+        dtype = {"names": [field.name for field in self.fields],
+                 "formats": ["S%d" % field.length for field in self.fields],
+                 "offsets": [field.location for field in self.fields]}
+        if self.records > 0:
+            dtype["itemsize"] = self.record_length
+            self.rows = np.ndarray((self.records,), np.dtype(dtype), buffer=mapped_data_file, offset=self.offset)
+        else:
+            self.rows = np.zeros((0,), np.dtype(dtype))
+        # Columns already decoded by column(), by field position
+        self._decoded_columns = {}
+
+    def __len__(self):
+        return self.records
+
+    def record(self, index):
+        record = self.rows[index]
+        return tuple(_decode_value(field, record[field_index]) for field_index, field in enumerate(self.fields))
+
+    def raw_column(self, field):
+        """Returns the values of a field (given by name or position) as a NumPy array of bytes that shares memory with
+        the data file. Values keep the padding of the field."""
+        return self.rows[self.fields[self._field_index(field)].name]
+
+    def column(self, field):
+        """Returns the values of a field (given by name or position) decoded according to its field_format: integers
+        for %d, %x (hexadecimal) and %0 (octal), floats for %f, %e and %E and stripped strings otherwise. Each column is
+        decoded once."""
+        field_index = self._field_index(field)
+        if field_index not in self._decoded_columns:
+            self._decoded_columns[field_index] = _decode_column(self.fields[field_index],
+                                                                self.rows[self.fields[field_index].name])
+        return self._decoded_columns[field_index]
+
+    def _field_index(self, field):
+        if isinstance(field, int):
+            return field
+        for field_index, field_description in enumerate(self.fields):
+            if field_description.name == field:
+                return field_index
+        raise PDS4meInputError(field, "there is no field %s in the table %s" % (field, self.name))
+
+    def _release(self):
+        # Drops the arrays that point to the mapped data file so it can be unmapped
+        self.rows = None
+        self._decoded_columns = {}
+
+
+def _specifier(field):
+    return field.field_format[-1] if field.field_format else "s"
+
+
+def _decode_column(field, raw_column):
+    specifier = _specifier(field)
+    if specifier == "d":
+        return raw_column.astype(np.int64)
+    if specifier in _INTEGER_BASES:
+        # NumPy only converts decimal integers
+        base = _INTEGER_BASES[specifier]
+        return np.fromiter((int(raw_value, base) for raw_value in raw_column), dtype=np.int64, count=len(raw_column))
+    if specifier in "feE":
+        return raw_column.astype(np.float64)
+    return np.char.strip(np.char.decode(raw_column, "ascii"))
+
+
+def _decode_value(field, raw_value):
+    specifier = _specifier(field)
+    if specifier in _INTEGER_BASES:
+        return int(raw_value, _INTEGER_BASES[specifier])
+    if specifier in "feE":
+        return float(raw_value)
+    return raw_value.decode("ascii").strip()
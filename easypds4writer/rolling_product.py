@@ -0,0 +1,209 @@
+"""
+RollingProduct Module
+Public classes in the module:
+  RollingProductWriter
+"""
+import copy
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from easypds4writer.product_observational import PDS4meInputError
+from easypds4writer.table_character import DEFAULT_CHUNK_SIZE
+
+# Description of one shard (product) written by a RollingProductWriter, as given to the metadata callback.
+#   index: number of the shard, counting from 0.
+#   data_file_name: name of its data file.
+#   key: value of the time key of its records, or None if no time key is used.
+#   records: number of records written to the shard, in all its tables.
+#   first_record, last_record: first and last records written to the shard, as tuples.
+ShardInfo = namedtuple("ShardInfo", "index data_file_name key records first_record last_record")
+
+
+class RollingProductWriter:
+    """"
+    RollingProductWriter class: Splits a stream of records into many products (shards) of the same type.
+
+      Records are added as to a ProductObservational, and a new product is started automatically whenever the
+      current one would exceed a number of records or a size of its data file, or when the time key of the records
+      changes (e.g. the day of their time stamp). The product type (template and declared tables) is set up once.
+      The label of a finished shard is written by a background thread while the next shard is already receiving
+      records.
+      Methods:
+        __init__(self, product_type, file_name_pattern, ...):
+                                                Initialize the writer. The options are described in __init__.
+        add_record(self, record, table=0):      Adds a record to a table (given by position or name) of the product.
+        add_records(self, columns, table=0):    Adds a block of records given column by column, as add_records of
+                                                TableCharacter. The block is split among shards as needed.
+        write_from(self, records, table=0):     Adds all the records of an iterable.
+        roll_over(self):                        Finishes the current shard. The next record starts a new one.
+        close(self):                            Finishes the current shard and waits until all labels are written.
+      Attributes:
+        shards:                                 List of ShardInfo of the shards finished so far.
+    """
+
+    def __init__(self, product_type, file_name_pattern, max_records=None, max_bytes=None, time_key=None,
+                 metadata_callback=None, finalize_in_background=True):
+        """"
+        Initialization method
+
+        Arguments:
+            product_type: ProductObservational with its tables and fields already declared. It is copied, so it is
+                          not used to write products itself.
+            file_name_pattern: Pattern of the names of the data files, formatted with str.format with the fields
+                               shard (the number of the shard) and key (its time key), e.g. "tm_{shard:05d}.tab".
+            max_records: Maximum number of records of a shard, in all its tables.
+            max_bytes: Maximum size in bytes of the data file of a shard. A shard gets at least one record even if it
+                       is larger.
+            time_key: Callable that receives a record (a tuple) and returns its time key, for example the day of its
+                      time stamp. All the records of a shard have the same key.
+            metadata_callback: Callable that receives the ShardInfo of a shard when it is finished and returns a
+                               dictionary of variables and values for set_metadata.
+            finalize_in_background: If True the label of a finished shard is written by a background thread while
+                                    the next one receives records. Otherwise it is written before continuing.
+        """
+        self._file_name_pattern = file_name_pattern
+        self._max_records = max_records
+        self._max_bytes = max_bytes
+        self._time_key = time_key
+        self._metadata_callback = metadata_callback
+        # While a product is being finished in the background the next shard is written with another copy of the
+        # product type, so two copies are enough.
+        number_of_products = 2 if finalize_in_background else 1
+        self._products = [copy.deepcopy(product_type) for _ in range(number_of_products)]
+        # Future of the close_product running in the background for each product, if any
+        self._closing = [None] * number_of_products
+        self._executor = ThreadPoolExecutor(max_workers=1) if finalize_in_background else None
+        self._product_index = 0
+        self.shards = []
+
+        # State of the shard being written. _product is None if there is none.
+        self._product = None
+        self._shard_data_file_name = None
+        self._shard_key = None
+        self._shard_records = 0
+        self._shard_bytes = 0
+        self._first_record = None
+        self._last_record = None
+
+    def add_record(self, record, table=0):
+        self._write(table, 1, lambda pds4_object, start, stop: pds4_object.add_record(record), lambda index: record)
+
+    def add_records(self, columns, table=0):
+        number_of_records = len(columns[0]) if len(columns) else 0
+        self._write(table, number_of_records,
+                    lambda pds4_object, start, stop: pds4_object.add_records([column[start:stop] for column in columns]),
+                    lambda index: tuple(column[index] for column in columns))
+
+    def write_from(self, records, table=0):
+        """Adds all the records (sequences with one value per field) of an iterable, read in chunks"""
+        records = iter(records)
+        for chunk in iter(lambda: list(map(tuple, islice(records, DEFAULT_CHUNK_SIZE))), []):
+            self._write(table, len(chunk),
+                        lambda pds4_object, start, stop: pds4_object.write_from(chunk[start:stop]),
+                        chunk.__getitem__)
+
+    def roll_over(self):
+        """Finishes the current shard, if any. Its label is written in the background if so configured."""
+        if self._product is None:
+            return
+        shard = ShardInfo(len(self.shards), self._shard_data_file_name, self._shard_key, self._shard_records,
+                          self._first_record, self._last_record)
+        if self._metadata_callback is not None:
+            for variable, value in self._metadata_callback(shard).items():
+                self._product.set_metadata(variable, value)
+        if self._executor is not None:
+            self._closing[self._product_index] = self._executor.submit(self._product.close_product)
+        else:
+            self._product.close_product()
+        self.shards.append(shard)
+        self._product = None
+        self._product_index = (self._product_index + 1) % len(self._products)
+
+    def close(self):
+        """Finishes the current shard and waits until the labels of all the shards are written. Errors writing them
+        in the background are raised here, once all of them are finished."""
+        self.roll_over()
+        errors = []
+        for product_index in range(len(self._products)):
+            try:
+                self._wait_for_product(product_index)
+            except Exception as error:
+                errors.append(error)
+        if self._executor is not None:
+            self._executor.shutdown()
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _write(self, table, number_of_records, write_function, record_at):
+        # Writes the records start to stop of a block with write_function(pds4_object, start, stop), splitting the
+        # block among as many shards as needed. record_at(index) returns record index of the block as a tuple.
+        table_index = self._table_index(table)
+        start = 0
+        while start < number_of_records:
+            key = self._time_key(record_at(start)) if self._time_key is not None else None
+            if self._product is not None and key != self._shard_key:
+                self.roll_over()
+            if self._product is None:
+                self._new_shard(key)
+            pds4_object = self._product._list_of_objects[table_index]
+            stop = start + self._room(pds4_object, number_of_records - start)
+            if stop == start:
+                self.roll_over()
+                continue
+            if self._time_key is not None:
+                for index in range(start + 1, stop):
+                    if self._time_key(record_at(index)) != key:
+                        stop = index
+                        break
+            write_function(pds4_object, start, stop)
+            if self._shard_records == 0:
+                self._first_record = tuple(record_at(start))
+            self._last_record = tuple(record_at(stop - 1))
+            self._shard_records += stop - start
+            self._shard_bytes += (stop - start) * pds4_object._record_character.compiled_format().record_length
+            start = stop
+
+    def _room(self, pds4_object, number_of_records):
+        # Number of the given records that still fit in the current shard. An empty shard takes at least one.
+        room = number_of_records
+        if self._max_records is not None:
+            room = min(room, self._max_records - self._shard_records)
+        if self._max_bytes is not None:
+            record_length = pds4_object._record_character.compiled_format().record_length
+            room = min(room, (self._max_bytes - self._shard_bytes) // record_length)
+        if self._shard_records == 0:
+            room = max(room, 1)
+        return max(room, 0)
+
+    def _new_shard(self, key):
+        self._wait_for_product(self._product_index)
+        self._product = self._products[self._product_index]
+        self._shard_data_file_name = self._file_name_pattern.format(shard=len(self.shards), key=key)
+        self._shard_key = key
+        self._shard_records = 0
+        self._shard_bytes = 0
+        self._first_record = None
+        self._last_record = None
+        self._product.new_product(self._shard_data_file_name)
+
+    def _wait_for_product(self, product_index):
+        # Waits until the product is not finishing a shard in the background, raising the error if it failed
+        closing = self._closing[product_index]
+        if closing is not None:
+            self._closing[product_index] = None
+            closing.result()
+
+    def _table_index(self, table):
+        if isinstance(table, int):
+            return table
+        for table_index, pds4_object in enumerate(self._products[0]._list_of_objects):
+            if pds4_object._name == table:
+                return table_index
+        raise PDS4meInputError(table, "there is no table %s in the product" % table)
@@ -1,8 +1,20 @@
 
-from collections import namedtuple
+import os
+from collections import deque, namedtuple
+from itertools import islice
 
+from easypds4writer.private.label_template import PLACEHOLDER_PATTERN
 from easypds4writer.private.table_base import TableBase
 
+# Default number of records formatted and written at once by TableCharacter.write_from
+DEFAULT_CHUNK_SIZE = 10000
+# Approximate size in bytes of the blocks of records formatted and written at once by TableCharacter.add_records. The
+# records of a block are taken from the columns when it is formatted, so small blocks stay in the CPU caches.
+FORMAT_BLOCK_BYTES = 256 * 1024
+# Maximum number of chunks being formatted by an executor at the same time. Chunks are formatted in parallel but
+# written in order, so this bounds the memory used by the chunks waiting to be written.
+MAX_PENDING_CHUNKS = 2 * (os.cpu_count() or 1)
+
 """The Table Character class is an extension of table base and defines a simple character table."""
 
 class TableCharacter(TableBase):
@@ -14,6 +26,9 @@ class TableCharacter(TableBase):
         # The Record_Character class is a component of the table class and defines a record of the table.
         self._record_character = RecordCharacter()
         self._name = name
+        # If True every method writing records validates them (see validate) before writing them, so for example NaN
+        # and infinite values are rejected. Otherwise only the widths of the values are checked, when formatting them.
+        self.validate_records = False
 
     """This function adds a new field definition to the record. This implies appending a new field_character object
     to the record_character object"""
@@ -30,13 +45,40 @@ class TableCharacter(TableBase):
         field_character.unit = unit
         field_character.description = description
         self._record_character.field_character.append(field_character)
+        # The record changed, so the compiled record format (if any) is no longer valid
+        self._record_character.invalidate_compiled_format()
+
+    """"Declares the fields of the table from a NumPy structured array or dtype, one field per named field, choosing
+    their data_type and the narrowest field_format that fits the values of sample (a structured array or an iterable
+    of them, scanned one at a time, e.g. the first blocks of a stream). If no sample is given the values of the array
+    are used, and for a dtype alone the formats fit any value of its types. units and descriptions are optional
+    dictionaries by field name. Returns the list of FieldDeclaration used, which can be given instead of the array to
+    declare the same fields in another table without scanning the data again."""
+    def declare_fields_from(self, array_or_dtype, sample=None, units=None, descriptions=None):
+        if isinstance(array_or_dtype, list):
+            field_declarations = array_or_dtype
+        else:
+            # Imported here so that NumPy is only needed by the methods that use it
+            from easypds4writer.private.schema_inference import infer_field_declarations
+            try:
+                field_declarations = infer_field_declarations(array_or_dtype, sample, units, descriptions)
+            except ValueError as error:
+                raise PDS4meInputError(array_or_dtype, str(error))
+        for field_declaration in field_declarations:
+            self.declare_field(*field_declaration)
+        return field_declarations
 
     """"Writes in the data file a new record (line of text). To do that it has to format the inputs into a single line
     of text and end the line with appropriate line ending (e.g. CR LF)"""
     def add_record(self, record):
-        # TODO. Validate inputs
-        #    - if it is a list and the number of items matches the number and type of the fields)
-        #    - If the size of the number or string fits in the space defined in the field format etc
+        # The record template, the field widths and the width validation only depend on the declared fields so they
+        # are compiled once and reused for every record of every product of this type.
+        compiled_format = self._record_character.compiled_format()
+        if self.validate_records:
+            if self._stats is None:
+                self._validate_record(record)
+            else:
+                self._stats.validate(self._validate_record, record)
 
         # Check if it is the first time new data is written in this object and if so change the status of
         # _already_being_written variable and save which is the byte number of the beginning of the object (offset)
@@ -44,115 +86,295 @@ class TableCharacter(TableBase):
             self._already_being_written = True
             self._offset= self._fp_data_file.tell()
 
-        # Prepare a template for the record where the values will be substituted. Example of a template
-        # with two strings and one number: %-23s, %+6s, %7.3f
-        i= 0
-        formatted_record_template= ""
-        for field in record:
-            # Check that the provided value fits in the field width and raise a exception if not
-            field_width = int(self._record_character.field_character[i].parsed_field_format.width)
-            field_format = self._record_character.field_character[i].field_format
-            formatted_field= field_format % field
-            if len(formatted_field) > field_width:
-                error_message = "Value %s is wider than the width of field %s which is %d" % (formatted_field, self._record_character.field_character[i].name, field_width)
-                raise PDS4meInputError(field, error_message)
-
-            # Concatenate field formats
-            if i==0:
-                formatted_record_template = field_format
-            else:
-                formatted_record_template = formatted_record_template + ", " + field_format
-            i= i+1
-
-        # Add line ending
-        # \n is supposed to introduce a CR LF line ending in both Windows and Linus if the file was opened with
-        # the parameter newline='\r\n'
-        formatted_record_template += "\n"
-        formatted_record= formatted_record_template % record
-
-        # Write the formatted record to the file
-        self._fp_data_file.write(formatted_record)
+        # Format the whole record at once. The template ends with \n which is supposed to introduce a CR LF line
+        # ending in both Windows and Linux if the file was opened with the parameter newline='\r\n'. It raises an
+        # exception if any value does not fit in the width of its field.
+        # Write the formatted record to the file. If statistics are collected the same is done timing each step.
+        if self._stats is None:
+            self._fp_data_file.write(compiled_format.format_record(record))
+        else:
+            self._stats.write(self._fp_data_file.write, self._stats.format(compiled_format.format_record, record), 1)
 
-        # Calculate the record length including the line ending character. len function only counts one character as
-        # line ending when actually there are two that is way +1 is added
-        self._record_character._record_length= len(formatted_record) + 1
+        # The record length includes the two characters of the line ending
+        self._record_character._record_length= compiled_format.record_length
         self._records = self._records + 1
+        if self._after_write is not None:
+            self._after_write()
+
+    """"Writes in the data file a block of new records given column by column (one sequence or NumPy array per
+    declared field, in the order the fields were declared). The widths of NumPy columns are checked column by column
+    before writing anything. The records are formatted and written in blocks of about FORMAT_BLOCK_BYTES bytes, whose
+    lengths also check the widths of the other columns. The output is the same as calling add_record once per record.
+    If an executor is given the records are formatted in chunks of chunk_size records by the executor, as in
+    write_from."""
+    def add_records(self, columns, executor=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        compiled_format = self._record_character.compiled_format()
+        if self.validate_records:
+            self._validate_block(columns)
+        if len(columns) != len(compiled_format.field_formats):
+            error_message = "%d columns were provided but the record has %d fields" % (len(columns), len(compiled_format.field_formats))
+            raise PDS4meInputError(columns, error_message)
+
+        # Sequences and NumPy arrays are sliced in blocks, other iterables are read first
+        columns = [column if hasattr(column, "__getitem__") else list(column) for column in columns]
+        number_of_records = len(columns[0]) if columns else 0
+        for column in columns:
+            if len(column) != number_of_records:
+                raise PDS4meInputError(columns, "All the columns must have the same number of values")
+        if number_of_records == 0:
+            return
+        for field_index, column in enumerate(columns):
+            if hasattr(column, "dtype"):
+                self._check_column_width(compiled_format, field_index, column)
+
+        if executor is not None:
+            chunks = (list(zip(*_column_block(columns, first, chunk_size)))
+                      for first in range(0, number_of_records, chunk_size))
+            self._write_chunks_in_executor(chunks, executor, compiled_format)
+            return
+        # The records are never built all at once, each block takes them from the columns as it is formatted
+        block_size = max(1, FORMAT_BLOCK_BYTES // compiled_format.record_length)
+        for first in range(0, number_of_records, block_size):
+            block = _column_block(columns, first, block_size)
+            if self._stats is None:
+                formatted_records = compiled_format.format_columns(block)
+            else:
+                formatted_records = self._stats.format(compiled_format.format_columns, block)
+            self._write_formatted_records(formatted_records, len(block[0]), compiled_format)
+
+    """"Validates a block of records given column by column, as for add_records, without writing it. Raises
+    PDS4meValidationError listing every problem found: wrong number of columns or values, values whose type does not
+    match the data_type or field_format of their field, NaN or infinite values and values wider than their field.
+    If validate_records is True the methods writing records validate them this way before writing them."""
+    def validate(self, columns):
+        from easypds4writer.private.validation import validate_columns
+        violations = validate_columns(self._record_character.compiled_format(), columns)
+        if violations:
+            raise PDS4meValidationError(violations)
+
+    """"Writes in the data file the records contained in a NumPy structured array. The fields of the array are taken
+    in order as the columns of the table, therefore they must follow the order in which the fields were declared."""
+    def add_array(self, structured_ndarray):
+        columns = [structured_ndarray[name] for name in structured_ndarray.dtype.names]
+        self.add_records(columns)
+
+    """"Writes in the data file all the records given by an iterable (e.g. a list, a generator, a csv.reader or a
+    database cursor), each of them a sequence with one value per field. The records are read, formatted and written
+    in chunks of chunk_size records so memory use does not depend on the total number of records. Returns the number
+    of records written.
+    If an executor is given (a concurrent.futures.ProcessPoolExecutor, so that formatting is not bound to one core)
+    the chunks are formatted by the executor, several at a time, and written as they are ready in their original
+    order. The output is the same as without executor."""
+    def write_from(self, records, chunk_size=DEFAULT_CHUNK_SIZE, executor=None):
+        compiled_format = self._record_character.compiled_format()
+        records = iter(records)
+        # The records are converted to tuples, as needed for the % operator, if they are lists or other sequences
+        chunks = iter(lambda: list(map(tuple, islice(records, chunk_size))), [])
+        if self.validate_records:
+            chunks = map(self._validate_records, chunks)
+        if executor is not None:
+            return self._write_chunks_in_executor(chunks, executor, compiled_format)
+        number_of_records = 0
+        for chunk in chunks:
+            self._write_formatted_records(self._format_records(compiled_format, chunk), len(chunk), compiled_format)
+            number_of_records += len(chunk)
+        return number_of_records
+
+    """"Writes records (sequences with one value per field) as the rows index, index + 1, ... of the table. It is only
+    available for products created with preallocated records (see ProductObservational.new_product), where every row
+    has its final place in the data file. Rows can be written in any order, more than once, and from several threads
+    at once as long as they write different rows."""
+    def write_records_at(self, index, records):
+        compiled_format = self._record_character.compiled_format()
+        if not hasattr(self._fp_data_file, "write_encoded_at"):
+            raise PDS4meInputError(index, "records can only be written at a given row in products with preallocated records")
+        records = list(map(tuple, records))
+        if self.validate_records:
+            self._validate_records(records)
+        record_length = compiled_format.record_length
+        if index < 0 or (index + len(records)) * record_length > self._fp_data_file.size:
+            error_message = "rows %d to %d are out of the %d rows preallocated for the table %s" % \
+                            (index, index + len(records) - 1, self._fp_data_file.size // record_length, self._name)
+            raise PDS4meInputError(index, error_message)
+        if self._stats is None:
+            self._fp_data_file.write_encoded_at(index * record_length, compiled_format.encode_records(records))
+        else:
+            write_function = lambda data: self._fp_data_file.write_encoded_at(index * record_length, data)
+            self._stats.write(write_function, self._stats.format(compiled_format.encode_records, records), len(records))
+
+    """"Writes a record as the row index of the table. See write_records_at."""
+    def write_record_at(self, index, record):
+        self.write_records_at(index, [record])
+
+    def _check_column_width(self, compiled_format, field_index, column):
+        # Raises PDS4meInputError for the first value of a NumPy array wider than its field
+        from easypds4writer.private.validation import column_width_violations
+        violations = column_width_violations(compiled_format, field_index, column)
+        if violations:
+            value = column[violations[0].row].item()
+            compiled_format.check_field_width(field_index, value, compiled_format.field_formats[field_index] % value)
+
+    def _validate_record(self, record):
+        # Single records are checked value by value with the checks compiled for each field
+        from easypds4writer.private.validation import validate_record
+        violations = validate_record(self._record_character.compiled_format().field_checks(), record)
+        if violations:
+            raise PDS4meValidationError(violations)
+
+    def _validate_block(self, columns):
+        if self._stats is None:
+            self.validate(columns)
+        else:
+            self._stats.validate(self.validate, columns)
+
+    def _validate_records(self, records):
+        # Validates a list of records given record by record and returns it
+        number_of_fields = len(self._record_character.field_character)
+        for record in records:
+            if len(record) != number_of_fields:
+                error_message = "%d values were provided but the record has %d fields" % (len(record), number_of_fields)
+                raise PDS4meInputError(record, error_message)
+        self._validate_block(list(zip(*records)) if records else [[] for _ in range(number_of_fields)])
+        return records
+
+    def _write_chunks_in_executor(self, chunks, executor, compiled_format):
+        # Data writers that accept encoded records get them encoded by the executor, with CR LF line endings
+        encode = hasattr(self._fp_data_file, "write_encoded")
+        if encode:
+            record_template, record_length = compiled_format._encoded_record_template, compiled_format.record_length
+        else:
+            record_template, record_length = compiled_format.record_template, compiled_format.formatted_length
+        # Chunks being formatted, in the order they have to be written
+        pending_chunks = deque()
+        number_of_records = 0
+        try:
+            for chunk in chunks:
+                pending_chunks.append((chunk, executor.submit(_format_chunk, record_template, record_length, chunk,
+                                                              encode)))
+                if len(pending_chunks) >= MAX_PENDING_CHUNKS:
+                    number_of_records += self._write_formatted_chunk(pending_chunks.popleft(), compiled_format)
+            while pending_chunks:
+                number_of_records += self._write_formatted_chunk(pending_chunks.popleft(), compiled_format)
+        finally:
+            # After an error the chunks not written yet are not needed any more
+            for chunk, future in pending_chunks:
+                future.cancel()
+        return number_of_records
+
+    def _write_formatted_chunk(self, pending_chunk, compiled_format):
+        chunk, future = pending_chunk
+        if self._stats is None:
+            formatted_records = future.result()
+        else:
+            formatted_records = self._stats.format(lambda future: future.result(), future)
+        if formatted_records is None:
+            # Some value did not fit in its field. Formatting the chunk again here raises the error with its details.
+            formatted_records = compiled_format.format_records(chunk)
+        self._write_formatted_records(formatted_records, len(chunk), compiled_format)
+        return len(chunk)
+
+    def _format_records(self, compiled_format, records):
+        if self._stats is None:
+            return compiled_format.format_records(records)
+        return self._stats.format(compiled_format.format_records, records)
+
+    def _write_formatted_records(self, formatted_records, number_of_records, compiled_format):
+        # Check if it is the first time new data is written in this object and if so save the offset
+        if not self._already_being_written:
+            self._already_being_written = True
+            self._offset= self._fp_data_file.tell()
 
-    def writte_label(self, child, ET):
+        # As in add_record, \n becomes CR LF because the file was opened with the parameter newline='\r\n'. Records
+        # already encoded (as bytes) already have CR LF line endings.
+        if isinstance(formatted_records, str):
+            write_function = self._fp_data_file.write
+        else:
+            write_function = self._fp_data_file.write_encoded
+        if self._stats is None:
+            write_function(formatted_records)
+        else:
+            self._stats.write(write_function, formatted_records, number_of_records)
+
+        # The record length includes the two characters of the line ending
+        self._record_character._record_length= compiled_format.record_length
+        self._records = self._records + number_of_records
+        if self._after_write is not None:
+            self._after_write()
+
+    def _checkpoint_state(self):
+        state = super()._checkpoint_state()
+        state["record_length"] = self._record_character._record_length
+        return state
+
+    def _restore_checkpoint_state(self, state):
+        # The records already written must have the format of the records that will be added now
+        record_length = self._record_character.compiled_format().record_length
+        if state["records"] > 0 and state["record_length"] != record_length:
+            error_message = "the checkpoint has records of %d bytes but the table %s has records of %d bytes" % \
+                            (state["record_length"], self._name, record_length)
+            raise PDS4meInputError(state, error_message)
+        super()._restore_checkpoint_state(state)
+        self._record_character._record_length = state["record_length"]
+
+    def _preallocated_size(self, records):
+        # Number of bytes taken in the data file by the given number of records
+        return records * self._record_character.compiled_format().record_length
+
+    def _set_preallocated_records(self, offset, records):
+        # Sets the attributes written to the label for a table whose records were preallocated at offset
+        if records > 0:
+            self._already_being_written = True
+            self._offset = offset
+            self._records = records
+            self._record_character._record_length = self._record_character.compiled_format().record_length
 
-        # Write Table_Character and its children
+    def _label_placeholders(self):
+        return self._record_character.compiled_format().placeholders
 
-        table_character = ET.SubElement(child, "Table_Character")
+    def _end_of_data(self):
+        if not self._already_being_written:
+            return None
+        return self._offset + self._records * self._record_character._record_length
 
-        offset = ET.SubElement(table_character, "offset")
-        offset.text = str(self._offset)
-        offset.set('unit', 'byte')
+    def write_label(self, label_writer):
+        """Writes the Table_Character element and its children to the label with a LabelWriter"""
 
-        records = ET.SubElement(table_character, "records")
-        records.text = str(self._records)
+        # Write Table_Character and its children
 
-        record_delimiter = ET.SubElement(table_character, "record_delimiter")
-        record_delimiter.text = self._record_delimiter
+        label_writer.start("Table_Character")
+        label_writer.element("offset", str(self._offset), unit="byte")
+        label_writer.element("records", str(self._records))
+        label_writer.element("record_delimiter", self._record_delimiter)
 
         # Write Record_Character and its children
 
-        record_character = ET.SubElement(table_character, "Record_Character")
-
-        fields = ET.SubElement(record_character, "fields")
-        fields.text = str(self._record_character.fields)
-
-        groups = ET.SubElement(record_character, "groups")
-        groups.text = '0'
-
-        record_length = ET.SubElement(record_character, "record_length")
-        record_length.text = str(self._record_character._record_length)
-        record_length.set('unit', 'byte')
-
-        # Write the Record_Character objectS and its children. There will be as many as fields (columns) in the table
-
-        # The field_number attribute provides the position of a field, within a series of fields, counting from 1
-        field_number= 1
-
-        # The field_location attribute provides the starting byte for a field within a record or group,
-        # counting from '1'
-        field_location= 1
+        label_writer.start("Record_Character")
+        label_writer.element("fields", str(self._record_character.fields))
+        label_writer.element("groups", "0")
+        label_writer.element("record_length", str(self._record_character._record_length), unit="byte")
 
-        for field_character in self._record_character.field_character:
+        # Write the Field_Character objects and its children. There will be as many as fields (columns) in the table.
+        # They only depend on the declared fields so they are serialized once and reused for every product.
+        label_writer.write(self._record_character.compiled_format().field_characters_label(label_writer))
 
-            field_character_xml = ET.SubElement(record_character, "Field_Character")
+        label_writer.end()
+        label_writer.end()
 
-            name = ET.SubElement(field_character_xml, "name")
-            name.text = field_character.name
+def _column_block(columns, first, block_size):
+    # Values of the records first to first + block_size - 1 of every column. NumPy arrays are converted to lists of
+    # Python scalars, which is faster to format and gives exactly the same text as formatting the NumPy scalars.
+    return [column[first:first + block_size].tolist() if hasattr(column, "tolist") else column[first:first + block_size]
+            for column in columns]
 
-            field_number_xml = ET.SubElement(field_character_xml, "field_number")
-            field_number_xml.text = str(field_number)
 
-            field_location_xml = ET.SubElement(field_character_xml, "field_location")
-            field_location_xml.text = str(field_location)
-            field_location_xml.set('unit', 'byte')
+def _format_chunk(record_template, record_length, records, encode):
+    # Formats a chunk of records in an executor (possibly in another process, so it only receives what it needs).
+    # Returns None if some value did not fit in its field, in which case the records have not the expected length.
+    formatted_records = "".join(map(record_template.__mod__, records))
+    if len(formatted_records) != len(records) * record_length:
+        return None
+    return formatted_records.encode("ascii") if encode else formatted_records
 
-            data_type = ET.SubElement(field_character_xml, "data_type")
-            data_type.text = field_character.data_type
-
-            # parsed_field_format= self._parse_field_format(field_character.field_format)
-
-            # field_length= parsed_field_format.width
-            field_length = field_character.parsed_field_format.width
-            field_length_xml = ET.SubElement(field_character_xml, "field_length")
-            field_length_xml.text = field_length
-            field_length_xml.set('unit', 'byte')
-
-            field_format = ET.SubElement(field_character_xml, "field_format")
-            field_format.text = field_character.field_format
-
-            unit = ET.SubElement(field_character_xml, "unit")
-            unit.text = field_character.unit
-
-            description = ET.SubElement(field_character_xml, "description")
-            description.text = field_character.description
-
-            field_number = field_number + 1
-            field_location= field_location + int(field_length) + 2 #The 2 is for two field delimiter characters ", ". To be removed the hard coding of this value
 
 """The Record_Character class is a component of the table class and defines a record of the table."""
 class RecordCharacter:
@@ -165,6 +387,140 @@ class RecordCharacter:
         self._record_length = 0
         self.field_character = []
         self._group_field_character = []
+        # CompiledRecordFormat built from field_character the first time a record is written. It is kept for all the
+        # products of the same type and discarded whenever a new field is declared.
+        self._compiled_format = None
+
+    def compiled_format(self):
+        """Returns the CompiledRecordFormat of the record, compiling it if the fields changed since the last call"""
+        if self._compiled_format is None:
+            self._compiled_format = CompiledRecordFormat(self.field_character)
+        return self._compiled_format
+
+    def invalidate_compiled_format(self):
+        self._compiled_format = None
+
+
+"""The Compiled Record Format holds everything needed to format and validate a record that only depends on the declared
+fields: the record template, the field formats and the field widths as integers."""
+class CompiledRecordFormat:
+    def __init__(self, field_characters):
+        self._field_characters = list(field_characters)
+        self.field_names = [field_character.name for field_character in field_characters]
+        self.field_formats = [field_character.field_format for field_character in field_characters]
+        self.field_widths = [int(field_character.parsed_field_format.width) for field_character in field_characters]
+        self.parsed_field_formats = [field_character.parsed_field_format for field_character in field_characters]
+        self.data_types = [field_character.data_type for field_character in field_characters]
+        # Variables ($placeholders) in the texts of the fields written to the label, which set_metadata can replace
+        self.placeholders = []
+        for field_character in field_characters:
+            for text in (field_character.name, field_character.unit, field_character.description):
+                self.placeholders.extend(variable for variable in PLACEHOLDER_PATTERN.findall(text)
+                                         if variable not in self.placeholders)
+
+        # Template for the whole record where the values will be substituted. Example of a template with two strings
+        # and one number: %-23s, %+6s, %7.3f\n
+        self.record_template = ", ".join(self.field_formats) + "\n"
+        # The same template with the CR LF line ending, used to format records that are encoded straight away
+        self._encoded_record_template = ", ".join(self.field_formats) + "\r\n"
+
+        # Every value formatted with its field format is at least as wide as the field, so a formatted record has
+        # exactly this number of characters (fields, ", " delimiters and \n) only if all values fit in their fields.
+        self.formatted_length = sum(self.field_widths) + 2 * max(len(self.field_widths) - 1, 0) + 1
+        # The record_length includes the two characters of the CR LF line ending
+        self.record_length = self.formatted_length + 1
+
+        # Field_Character elements of the label already serialized and the level they were indented for
+        self._field_characters_label = None
+        # Checks of the values of each field used to validate single records, compiled the first time they are needed
+        self._field_checks = None
+
+    def format_record(self, record):
+        """Formats a record (a tuple with one value per field) into a line of text ending with \n. Raises
+        PDS4meInputError if a value is wider than its field."""
+        formatted_record = self.record_template % record
+        if len(formatted_record) != self.formatted_length:
+            # Slow path, only taken when there is an error, to find which value does not fit
+            for field_index, value in enumerate(record):
+                self.check_field_width(field_index, value, self.field_formats[field_index] % value)
+        return formatted_record
+
+    def format_records(self, records):
+        """Formats a list of records into a single block of text, each record ending with \n. Raises
+        PDS4meInputError for the first value that is wider than its field."""
+        formatted_records = "".join(map(self.record_template.__mod__, records))
+        if len(formatted_records) != len(records) * self.formatted_length:
+            for record in records:
+                self.format_record(record)
+        return formatted_records
+
+    def format_columns(self, columns):
+        """Formats a block of records given column by column (sequences with the same number of values) into a
+        single block of text, each record ending with \n. Raises PDS4meInputError for the first column with a value
+        wider than its field."""
+        formatted_records = "".join(map(self.record_template.__mod__, zip(*columns)))
+        if len(formatted_records) != len(columns[0]) * self.formatted_length:
+            # Slow path, only taken when there is an error, to find column by column which value does not fit
+            for field_index, column in enumerate(columns):
+                for value in column:
+                    self.check_field_width(field_index, value, self.field_formats[field_index] % value)
+        return formatted_records
+
+    def encode_records(self, records):
+        """Formats a list of records into a single block of ASCII bytes, each record ending with CR LF. Raises
+        PDS4meInputError for the first value that is wider than its field."""
+        formatted_records = "".join(map(self._encoded_record_template.__mod__, records))
+        if len(formatted_records) != len(records) * self.record_length:
+            for record in records:
+                self.format_record(record)
+        return formatted_records.encode("ascii")
+
+    def field_checks(self):
+        """Returns the checks of the values of every field used to validate single records"""
+        if self._field_checks is None:
+            from easypds4writer.private.validation import compile_field_checks
+            self._field_checks = compile_field_checks(self)
+        return self._field_checks
+
+    def field_characters_label(self, label_writer):
+        """Returns the Field_Character elements of the record serialized as children of the current element of
+        label_writer. They are only serialized the first time."""
+        if self._field_characters_label is None or self._field_characters_label[0] != label_writer.level:
+            field_writer = label_writer.child_writer()
+
+            # The field_number attribute provides the position of a field, within a series of fields, counting from 1
+            field_number= 1
+
+            # The field_location attribute provides the starting byte for a field within a record or group,
+            # counting from '1'
+            field_location= 1
+
+            for field_character in self._field_characters:
+                field_length = field_character.parsed_field_format.width
+
+                field_writer.start("Field_Character")
+                field_writer.element("name", field_character.name)
+                field_writer.element("field_number", str(field_number))
+                field_writer.element("field_location", str(field_location), unit="byte")
+                field_writer.element("data_type", field_character.data_type)
+                field_writer.element("field_length", field_length, unit="byte")
+                field_writer.element("field_format", field_character.field_format)
+                field_writer.element("unit", field_character.unit)
+                field_writer.element("description", field_character.description)
+                field_writer.end()
+
+                field_number = field_number + 1
+                field_location= field_location + int(field_length) + 2 #The 2 is for two field delimiter characters ", ". To be removed the hard coding of this value
+
+            self._field_characters_label = (label_writer.level, field_writer.getvalue())
+        return self._field_characters_label[1]
+
+    def check_field_width(self, field_index, value, formatted_field):
+        """Raises PDS4meInputError if formatted_field is wider than the field field_index"""
+        field_width = self.field_widths[field_index]
+        if len(formatted_field) > field_width:
+            error_message = "Value %s is wider than the width of field %s which is %d" % (formatted_field, self.field_names[field_index], field_width)
+            raise PDS4meInputError(value, error_message)
 
 
 """The Field_Character class defines a field of a character record or a field of a character group."""
@@ -274,6 +630,26 @@ class PDS4meInputError(Exception):
         self.message = message
 
 
+class PDS4meValidationError(PDS4meInputError):
+    """Exception raised when a block of records does not pass the validation.
 
+    Attributes:
+        violations -- list of Violation (row, field, reason) with every problem found
+        message -- explanation of the error, listing the first violations
+    """
 
-
+    # Number of violations included in the message
+    MAX_VIOLATIONS_IN_MESSAGE = 10
+
+    def __init__(self, violations):
+        lines = []
+        for violation in violations[:self.MAX_VIOLATIONS_IN_MESSAGE]:
+            location = "field %s" % violation.field if violation.field is not None else "record"
+            if violation.row is not None:
+                location += ", row %d" % violation.row
+            lines.append("%s: %s" % (location, violation.reason))
+        if len(violations) > self.MAX_VIOLATIONS_IN_MESSAGE:
+            lines.append("and %d more" % (len(violations) - self.MAX_VIOLATIONS_IN_MESSAGE))
+        message = "%d problems found validating the records:\n  %s" % (len(violations), "\n  ".join(lines))
+        super().__init__(violations, message)
+        self.violations = violations
@@ -0,0 +1,60 @@
+"""Tests of AsyncProductObservational writing products from asyncio code"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import easypds4writer.table_character
+from easypds4writer.async_product_observational import AsyncProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+NUMBER_OF_BLOCKS = 40
+BLOCK_SIZE = 50
+
+
+async def write_product(data_file_name, format_executor):
+    product = AsyncProductObservational(TEMPLATE, queue_size=1, format_executor=format_executor)
+    table = product.declare_table_character("t1")
+    table.declare_field("%6d", "ASCII_Integer", "k", "none", "k")
+    await product.new_product(data_file_name)
+    # All the blocks are added at once, they must be written in the order of the calls
+    await asyncio.gather(*[product.add_records(table, [list(range(first, first + BLOCK_SIZE))])
+                           for first in range(0, NUMBER_OF_BLOCKS * BLOCK_SIZE, BLOCK_SIZE)])
+    await asyncio.gather(*[product.add_record(table, (k,)) for k in range(-10, 0)])
+    await product.close_product()
+
+
+@pytest.mark.parametrize("format_block_bytes", [256 * 1024, 100])
+@pytest.mark.parametrize("threads", [0, 4])
+def test_concurrent_blocks_are_written_in_order(tmp_path, monkeypatch, threads, format_block_bytes):
+    # With small blocks each call to add_records queues several blocks
+    monkeypatch.setattr(easypds4writer.table_character, "FORMAT_BLOCK_BYTES", format_block_bytes)
+    data_file_name = str(tmp_path / "product.tab")
+    format_executor = ThreadPoolExecutor(threads) if threads else None
+    try:
+        asyncio.run(write_product(data_file_name, format_executor))
+    finally:
+        if format_executor is not None:
+            format_executor.shutdown()
+    with open(data_file_name, "rb") as fp_data:
+        assert fp_data.read() == b"".join(b"%6d\r\n" % k for k in list(range(NUMBER_OF_BLOCKS * BLOCK_SIZE)) +
+                                          list(range(-10, 0)))
+
+
+def test_errors_give_back_the_room_in_the_queue(tmp_path):
+    async def write_with_errors():
+        product = AsyncProductObservational(TEMPLATE, queue_size=1)
+        table = product.declare_table_character("t1")
+        table.declare_field("%2d", "ASCII_Integer", "k", "none", "k")
+        await product.new_product(str(tmp_path / "product.tab"))
+        for _ in range(3):
+            with pytest.raises(Exception):
+                await product.add_record(table, (1000,))
+        await asyncio.wait_for(product.add_record(table, (1,)), timeout=10)
+        await product.close_product()
+    asyncio.run(write_with_errors())
+    with open(str(tmp_path / "product.tab"), "rb") as fp_data:
+        assert fp_data.read() == b" 1\r\n"
@@ -0,0 +1,117 @@
+"""Tests of the checkpoints of products being written and of their resume after an interruption"""
+import os
+import re
+
+import pytest
+
+from easypds4writer.product_observational import CHECKPOINT_EXTENSION, PDS4meInputError, ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+VARIABLES_TEMPLATE = os.path.join(TEST_DIRECTORY, "reference", "variables_template.xml")
+
+RECORDS = [("ab%d" % j, j * 1.5) for j in range(100)]
+
+
+def make_product(**options):
+    product = ProductObservational(VARIABLES_TEMPLATE, **options)
+    t1 = product.declare_table_character("t1")
+    t1.declare_field("%-10s", "ASCII_String", "name", "none", "name")
+    t1.declare_field("%7.3f", "ASCII_Real", "value", "m", "value")
+    t2 = product.declare_table_character("t2")
+    t2.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    return product, t1, t2
+
+
+def set_metadata(product):
+    product.set_metadata("$product_title", "Resumed")
+    product.set_metadata("$start_time", "2020-01-01T00:00:00Z")
+    product.set_metadata("$stop_time", "2020-01-02T00:00:00Z")
+
+
+def read_product(data_file_name):
+    with open(data_file_name, "rb") as fp_data:
+        data = fp_data.read()
+    with open(os.path.splitext(data_file_name)[0] + ".xml") as fp_label:
+        label = re.sub(r"<creation_date_time>[^<]*<", "<", fp_label.read())
+    return data, label.replace(os.path.basename(data_file_name), "product.tab")
+
+
+def write_reference(data_file_name, **options):
+    product, t1, t2 = make_product(**options)
+    product.new_product(data_file_name)
+    set_metadata(product)
+    t1.add_records(list(zip(*RECORDS)))
+    t2.write_from([(k,) for k in range(7)])
+    product.close_product()
+    return read_product(data_file_name)
+
+
+@pytest.mark.parametrize("options", [{}, {"binary": True}, {"binary": True, "write_queue_size": 4},
+                                     {"checksum": True}])
+def test_resumed_product_is_the_same(tmp_path, options):
+    reference = write_reference(str(tmp_path / "reference.tab"), **options)
+    data_file_name = str(tmp_path / "resumed.tab")
+
+    product, t1, t2 = make_product(**options)
+    product.new_product(data_file_name)
+    set_metadata(product)
+    for record in RECORDS[:60]:
+        t1.add_record(record)
+    product.checkpoint()
+    # Records written after the checkpoint are lost with the interruption
+    for record in RECORDS[60:70]:
+        t1.add_record(record)
+    product._discard_product()
+
+    product, t1, t2 = make_product(**options)
+    product.new_product(data_file_name, resume=True)
+    for record in RECORDS[60:]:
+        t1.add_record(record)
+    t2.write_from([(k,) for k in range(3)])
+    product.checkpoint()
+    product._discard_product()
+
+    product.new_product(data_file_name, resume=True)
+    t2.write_from([(k,) for k in range(3, 7)])
+    product.close_product()
+    assert read_product(data_file_name) == reference
+    assert not os.path.exists(data_file_name + CHECKPOINT_EXTENSION)
+
+
+def test_resume_without_checkpoint_starts_a_new_product(tmp_path):
+    reference = write_reference(str(tmp_path / "reference.tab"))
+    data_file_name = str(tmp_path / "product.tab")
+    product, t1, t2 = make_product()
+    product.new_product(data_file_name, resume=True)
+    set_metadata(product)
+    t1.write_from(RECORDS)
+    t2.write_from([(k,) for k in range(7)])
+    product.close_product()
+    assert read_product(data_file_name) == reference
+
+
+def test_automatic_checkpoints(tmp_path):
+    data_file_name = str(tmp_path / "product.tab")
+    product, t1, t2 = make_product(checkpoint_interval=1e-9)
+    product.new_product(data_file_name)
+    set_metadata(product)
+    t1.add_record(RECORDS[0])
+    assert os.path.exists(data_file_name + CHECKPOINT_EXTENSION)
+    product.close_product()
+    assert not os.path.exists(data_file_name + CHECKPOINT_EXTENSION)
+
+
+def test_data_file_shorter_than_checkpoint_is_not_resumed(tmp_path):
+    data_file_name = str(tmp_path / "product.tab")
+    product, t1, t2 = make_product()
+    product.new_product(data_file_name)
+    t1.write_from(RECORDS[:10])
+    product.checkpoint()
+    product._discard_product()
+    # Part of the data file is lost
+    with open(data_file_name, "r+b") as fp_data:
+        fp_data.truncate(50)
+    product, t1, t2 = make_product()
+    with pytest.raises(PDS4meInputError):
+        product.new_product(data_file_name, resume=True)
+    assert os.path.getsize(data_file_name) == 50
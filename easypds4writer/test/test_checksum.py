@@ -0,0 +1,87 @@
+"""Tests of the MD5 checksum and size of the data file given in the label when checksum is True"""
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from easypds4writer.product_observational import ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+VARIABLES_TEMPLATE = os.path.join(TEST_DIRECTORY, "reference", "variables_template.xml")
+PDS4_NAMESPACE = "{http://pds.nasa.gov/pds4/pds/v1}"
+
+RECORDS = [("ab%d" % j, j * 1.5) for j in range(1000)]
+
+
+def make_product(**options):
+    product = ProductObservational(VARIABLES_TEMPLATE, checksum=True, **options)
+    t1 = product.declare_table_character("t1")
+    t1.declare_field("%-10s", "ASCII_String", "name", "none", "name")
+    t1.declare_field("%8.3f", "ASCII_Real", "value", "m", "value")
+    t2 = product.declare_table_character("t2")
+    t2.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    return product, t1, t2
+
+
+def set_metadata(product):
+    product.set_metadata("$product_title", "Checksum")
+    product.set_metadata("$start_time", "2020-01-01T00:00:00Z")
+    product.set_metadata("$stop_time", "2020-01-02T00:00:00Z")
+
+
+def assert_label_describes_data_file(data_file_name):
+    label = ET.parse(os.path.splitext(data_file_name)[0] + ".xml")
+    file_element = label.find(".//%sFile" % PDS4_NAMESPACE)
+    with open(data_file_name, "rb") as fp_data:
+        data = fp_data.read()
+    assert file_element.find(PDS4_NAMESPACE + "md5_checksum").text == hashlib.md5(data).hexdigest()
+    assert file_element.find(PDS4_NAMESPACE + "file_size").text == str(len(data))
+    assert file_element.find(PDS4_NAMESPACE + "file_size").get("unit") == "byte"
+
+
+@pytest.mark.parametrize("options", [{}, {"checksum_thread": True}, {"write_queue_size": 2},
+                                     {"write_queue_size": 2, "checksum_thread": True}, {"segmented_tables": True}])
+def test_checksum_matches_the_data_file(tmp_path, options):
+    data_file_name = str(tmp_path / "product.tab")
+    product, t1, t2 = make_product(**options)
+    product.new_product(data_file_name)
+    set_metadata(product)
+    for record in RECORDS[:10]:
+        t1.add_record(record)
+    t1.add_records(list(zip(*RECORDS[10:])))
+    t2.write_from([(k,) for k in range(7)])
+    product.close_product()
+    assert_label_describes_data_file(data_file_name)
+
+
+def test_checksum_of_preallocated_data_file(tmp_path):
+    data_file_name = str(tmp_path / "product.tab")
+    product, t1, t2 = make_product()
+    product.new_product(data_file_name, preallocated_records=[len(RECORDS), 7])
+    set_metadata(product)
+    # The rows are written out of order, so the checksum is computed from the mapped data file at the end
+    t1.write_records_at(500, RECORDS[500:])
+    t1.write_records_at(0, RECORDS[:500])
+    t2.write_records_at(0, [(k,) for k in range(7)])
+    product.close_product()
+    assert_label_describes_data_file(data_file_name)
+
+
+def test_checksum_of_resumed_data_file(tmp_path):
+    data_file_name = str(tmp_path / "product.tab")
+    product, t1, t2 = make_product()
+    product.new_product(data_file_name)
+    set_metadata(product)
+    t1.write_from(RECORDS[:600])
+    product.checkpoint()
+    # Records written after the checkpoint are lost with the interruption
+    t1.write_from(RECORDS[600:700])
+    product._discard_product()
+
+    product, t1, t2 = make_product()
+    product.new_product(data_file_name, resume=True)
+    t1.write_from(RECORDS[600:])
+    t2.write_from([(k,) for k in range(7)])
+    product.close_product()
+    assert_label_describes_data_file(data_file_name)
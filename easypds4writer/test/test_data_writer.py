@@ -0,0 +1,99 @@
+"""Tests of the data writers of easypds4writer.private.data_writer"""
+import hashlib
+import io
+import os
+
+import pytest
+
+from easypds4writer.private.data_writer import BinaryDataWriter, DataSegment, QueuedDataWriter
+from easypds4writer.product_observational import ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+
+class FailingDataWriter:
+    """Data writer whose writes fail as if the disk were full"""
+
+    def __init__(self):
+        self.closed = False
+
+    def write_encoded(self, data):
+        raise OSError("disk full")
+
+    def tell(self):
+        return 0
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ShortWritesFile(io.RawIOBase):
+    """Unbuffered binary file whose writes write at most 7 bytes, as a write to a file may do"""
+
+    def __init__(self):
+        super().__init__()
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += bytes(data[:7])
+        return min(len(data), 7)
+
+
+@pytest.mark.parametrize("spill_threshold", [1 << 20, 10])
+@pytest.mark.parametrize("checksum", [False, True])
+def test_segments_are_copied_whole_with_short_writes(spill_threshold, checksum):
+    data = b"".join(b"%5d\r\n" % k for k in range(100))
+    data_segment = DataSegment(spill_threshold)
+    data_segment.write_encoded(data[:300])
+    data_segment.write_encoded(data[300:])
+    fp_output = ShortWritesFile()
+    md5 = hashlib.md5() if checksum else None
+    data_segment.copy_to(fp_output, md5)
+    data_segment.close()
+    assert bytes(fp_output.data) == data
+    if checksum:
+        assert md5.hexdigest() == hashlib.md5(data).hexdigest()
+
+
+def test_write_queue_errors_are_raised_by_every_later_call():
+    failing_data_writer = FailingDataWriter()
+    data_writer = QueuedDataWriter(failing_data_writer, 2)
+    data_writer.write_encoded(b"1\r\n")
+    with pytest.raises(OSError):
+        data_writer.flush()
+    # The records given after the error are not written, so every call keeps failing
+    with pytest.raises(OSError):
+        data_writer.write_encoded(b"2\r\n")
+    with pytest.raises(OSError):
+        data_writer.flush()
+    with pytest.raises(OSError):
+        data_writer.close()
+    assert failing_data_writer.closed
+
+
+def test_no_label_is_written_after_a_write_queue_error(tmp_path, monkeypatch):
+    def write_encoded(data_writer, data):
+        raise OSError("disk full")
+    monkeypatch.setattr(BinaryDataWriter, "write_encoded", write_encoded)
+    product = ProductObservational(TEMPLATE, binary=True, write_queue_size=2)
+    table = product.declare_table_character("t1")
+    table.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    product.new_product(str(tmp_path / "product.tab"))
+    table.add_record((1,))
+    with pytest.raises(OSError):
+        product.close_product()
+    assert not os.path.exists(str(tmp_path / "product.xml"))
+    # The product can be given up and a new one written
+    monkeypatch.undo()
+    product._discard_product()
+    product.new_product(str(tmp_path / "product.tab"))
+    table.add_record((1,))
+    product.close_product()
+    assert os.path.exists(str(tmp_path / "product.xml"))
@@ -0,0 +1,66 @@
+"""Tests of products whose data file is preallocated and written at given rows"""
+import errno
+import os
+import warnings
+
+import pytest
+
+from easypds4writer.private import data_writer
+from easypds4writer.product_observational import ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+
+def make_product():
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("t1")
+    table.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    return product, table
+
+
+def close_product(product):
+    with warnings.catch_warnings(record=True) as caught_warnings:
+        warnings.simplefilter("always")
+        product.close_product()
+    return [str(warning.message) for warning in caught_warnings if "preallocated" in str(warning.message)]
+
+
+def test_rows_written_in_any_order(tmp_path):
+    product, table = make_product()
+    product.new_product(str(tmp_path / "product.tab"), preallocated_records=[4])
+    table.write_record_at(3, (3,))
+    table.write_records_at(1, [(1,), (2,)])
+    table.write_record_at(0, (0,))
+    assert close_product(product) == []
+    with open(str(tmp_path / "product.tab"), "rb") as fp_data:
+        assert fp_data.read() == b"".join(b"%5d\r\n" % k for k in range(4))
+
+
+def test_rows_written_twice_do_not_hide_missing_rows(tmp_path):
+    product, table = make_product()
+    product.new_product(str(tmp_path / "product.tab"), preallocated_records=[3])
+    table.write_record_at(0, (1,))
+    table.write_record_at(0, (1,))
+    table.write_record_at(2, (3,))
+    assert len(close_product(product)) == 1
+
+
+def test_running_out_of_space_is_reported(tmp_path, monkeypatch):
+    def posix_fallocate(fd, offset, length):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+    monkeypatch.setattr(data_writer.os, "posix_fallocate", posix_fallocate, raising=False)
+    product, table = make_product()
+    with pytest.raises(OSError):
+        product.new_product(str(tmp_path / "product.tab"), preallocated_records=[3])
+
+
+def test_file_systems_without_fallocate_are_supported(tmp_path, monkeypatch):
+    def posix_fallocate(fd, offset, length):
+        raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+    monkeypatch.setattr(data_writer.os, "posix_fallocate", posix_fallocate, raising=False)
+    product, table = make_product()
+    product.new_product(str(tmp_path / "product.tab"), preallocated_records=[3])
+    table.write_records_at(0, [(1,), (2,), (3,)])
+    assert close_product(product) == []
+    assert os.path.getsize(str(tmp_path / "product.tab")) == 3 * 7
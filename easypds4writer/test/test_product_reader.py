@@ -0,0 +1,68 @@
+"""Tests of ProductReader reading back the products written by ProductObservational"""
+import os
+
+import numpy as np
+
+from easypds4writer.product_observational import ProductObservational
+from easypds4writer.product_reader import ProductReader
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+
+def write_product(data_file_name, records, **new_product_options):
+    product = ProductObservational(TEMPLATE)
+    t1 = product.declare_table_character("t1")
+    t1.declare_field("%-10s", "ASCII_String", "name", "none", "name")
+    t1.declare_field("%9.3f", "ASCII_Real", "value", "m", "value")
+    t1.declare_field("%+6d", "ASCII_Integer", "counter", "none", "counter")
+    t1.declare_field("%10.3E", "ASCII_Real", "exponential", "none", "exponential")
+    t2 = product.declare_table_character("t2")
+    t2.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    product.new_product(data_file_name, **new_product_options)
+    t1.write_from(records)
+    t2.write_from([(k,) for k in range(3)])
+    product.close_product()
+    return os.path.splitext(data_file_name)[0] + ".xml"
+
+
+def test_records_are_read_back(tmp_path):
+    records = [("name %d" % j, j * 0.125 - 50, j - 500, j * 1e10) for j in range(1000)]
+    with ProductReader(write_product(str(tmp_path / "product.tab"), records)) as reader:
+        assert [len(table) for table in reader.tables] == [1000, 3]
+        t1 = reader.table(0)
+        assert t1.record(0) == records[0]
+        assert t1.record(-1) == records[-1]
+        assert t1.column("name").tolist() == [record[0] for record in records]
+        assert t1.column(1).tolist() == [record[1] for record in records]
+        assert t1.column("counter").tolist() == [record[2] for record in records]
+        assert t1.column("exponential").tolist() == [record[3] for record in records]
+        assert np.shares_memory(t1.raw_column("value"), t1.rows)
+        assert reader.table(1).column("k").tolist() == [0, 1, 2]
+        del t1
+
+
+def test_empty_table_is_read_back(tmp_path):
+    with ProductReader(write_product(str(tmp_path / "product.tab"), [])) as reader:
+        assert len(reader.table(0)) == 0
+        assert reader.table(0).column("counter").tolist() == []
+        assert reader.table(1).column("k").tolist() == [0, 1, 2]
+
+
+def test_hexadecimal_integers_are_read_back(tmp_path):
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("t1")
+    table.declare_field("%4x", "ASCII_Integer", "hexadecimal", "none", "hexadecimal")
+    product.new_product(str(tmp_path / "product.tab"))
+    table.write_from([(10,), (255,), (-15,)])
+    product.close_product()
+    with ProductReader(str(tmp_path / "product.xml")) as reader:
+        assert reader.table(0).column(0).tolist() == [10, 255, -15]
+        assert reader.table(0).record(1) == (255,)
+
+
+def test_preallocated_product_is_read_back(tmp_path):
+    records = [("n%d" % j, j * 0.5, j, j * 1e3) for j in range(10)]
+    label_file_name = write_product(str(tmp_path / "product.tab"), records, preallocated_records=[10, 3])
+    with ProductReader(label_file_name) as reader:
+        assert [reader.table(0).record(index) for index in range(10)] == records
@@ -0,0 +1,326 @@
+"""
+Tests of the products written by ProductObservational: the data files and labels must be the same as those written by
+the first version of the library (add_record and ElementTree.write), which are kept in the reference directory, and
+the bulk writers must give exactly the same data file as add_record.
+
+The reference products are written by the write_* functions below. To write them again with another version of the
+library run: python easypds4writer/test/test_products.py <root of that version> <output directory>
+"""
+import os
+import re
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIRECTORY = os.path.join(TEST_DIRECTORY, "example_templates")
+REFERENCE_DIRECTORY = os.path.join(TEST_DIRECTORY, "reference")
+VARIABLES_TEMPLATE = os.path.join(REFERENCE_DIRECTORY, "variables_template.xml")
+PDS4_NAMESPACE = "{http://pds.nasa.gov/pds4/pds/v1}"
+
+TEMPLATE_NAMES = ["minimal_test_template", "example_template", "empty_template"]
+
+
+def declare_tables(product):
+    t1 = product.declare_table_character("t1")
+    t1.declare_field("%-10s", "ASCII_String", "name", "none", "a name & <stuff>")
+    t1.declare_field("%7.3f", "ASCII_Real", "val", "m", "value")
+    t1.declare_field("%+6d", "ASCII_Integer", "n", "none", "count")
+    t1.declare_field("%9.2e", "ASCII_Real", "e", "none", "exp")
+    t2 = product.declare_table_character("t2")
+    t2.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    return t1, t2
+
+
+def t1_records(number_of_records=20):
+    return [("ab%d" % j, (j % 100) * 1.5 - 20, j - 10, j * 1e5) for j in range(number_of_records)]
+
+
+def t2_records(number_of_records=5):
+    return [(j,) for j in range(number_of_records)]
+
+
+def write_template_product(output_directory, template_name):
+    from easypds4writer.product_observational import ProductObservational
+    product = ProductObservational(os.path.join(TEMPLATES_DIRECTORY, template_name + ".xml"))
+    t1, t2 = declare_tables(product)
+    product.new_product(os.path.join(output_directory, template_name + ".tab"))
+    for record in t1_records():
+        t1.add_record(record)
+    for record in t2_records():
+        t2.add_record(record)
+    product.close_product()
+
+
+def write_variables_product(output_directory):
+    from easypds4writer.product_observational import ProductObservational
+    product = ProductObservational(VARIABLES_TEMPLATE)
+    t1, t2 = declare_tables(product)
+    product.new_product(os.path.join(output_directory, "variables.tab"))
+    product.set_metadata("$product_title", "Product with variables")
+    product.set_metadata("$start_time", "2020-01-01T00:00:00Z")
+    product.set_metadata("$stop_time", "2020-01-02T00:00:00Z")
+    for record in t1_records(3):
+        t1.add_record(record)
+    product.close_product()
+
+
+def write_modified_label_product(output_directory):
+    from easypds4writer.product_observational import ProductObservational
+    product = ProductObservational(os.path.join(TEMPLATES_DIRECTORY, "minimal_test_template.xml"))
+    t1, t2 = declare_tables(product)
+    product.new_product(os.path.join(output_directory, "modified_label.tab"))
+    identification_area = product.label.find(PDS4_NAMESPACE + "Identification_Area")
+    ET.SubElement(identification_area, PDS4_NAMESPACE + "comment").text = "Added to the label"
+    for record in t2_records():
+        t2.add_record(record)
+    product.close_product()
+
+
+def write_field_variables_product(output_directory):
+    from easypds4writer.product_observational import ProductObservational
+    product = ProductObservational(VARIABLES_TEMPLATE)
+    table = product.declare_table_character("t1")
+    table.declare_field("%7.3f", "ASCII_Real", "val", "$val_unit", "$cal_version calibrated value")
+    product.new_product(os.path.join(output_directory, "field_variables.tab"))
+    product.set_metadata("$product_title", "Product with variables in its fields")
+    product.set_metadata("$start_time", "2020-01-01T00:00:00Z")
+    product.set_metadata("$stop_time", "2020-01-02T00:00:00Z")
+    product.set_metadata("$val_unit", "km")
+    product.set_metadata("$cal_version", "v2")
+    table.add_record((1.5,))
+    product.close_product()
+
+
+def write_reference_products(output_directory):
+    for template_name in TEMPLATE_NAMES:
+        write_template_product(output_directory, template_name)
+    write_variables_product(output_directory)
+    write_modified_label_product(output_directory)
+    write_field_variables_product(output_directory)
+
+
+def read_label(label_file_name):
+    # The creation time is the only part of the label that changes from one run to another
+    with open(label_file_name) as fp_label:
+        return re.sub(r"<creation_date_time>[^<]*</creation_date_time>", "<creation_date_time />", fp_label.read())
+
+
+def read_data(data_file_name):
+    with open(data_file_name, "rb") as fp_data:
+        return fp_data.read()
+
+
+def assert_same_product(product_name, output_directory):
+    assert read_data(os.path.join(output_directory, product_name + ".tab")) == \
+        read_data(os.path.join(REFERENCE_DIRECTORY, product_name + ".tab"))
+    assert read_label(os.path.join(output_directory, product_name + ".xml")) == \
+        read_label(os.path.join(REFERENCE_DIRECTORY, product_name + ".xml"))
+
+
+@pytest.mark.parametrize("template_name", TEMPLATE_NAMES)
+def test_template_products_match_reference(tmp_path, template_name):
+    write_template_product(str(tmp_path), template_name)
+    assert_same_product(template_name, str(tmp_path))
+
+
+def test_metadata_is_replaced_as_in_reference(tmp_path):
+    write_variables_product(str(tmp_path))
+    assert_same_product("variables", str(tmp_path))
+
+
+def test_variables_in_fields_are_replaced_as_in_reference(tmp_path):
+    write_field_variables_product(str(tmp_path))
+    assert_same_product("field_variables", str(tmp_path))
+
+
+def test_only_variables_used_in_the_label_can_be_set():
+    from easypds4writer.product_observational import PDS4meInputError, ProductObservational
+    product = ProductObservational(VARIABLES_TEMPLATE)
+    declare_tables(product)
+    for variable in ("start_time", "$unknown", "$1", "$start-time"):
+        with pytest.raises(PDS4meInputError):
+            product.set_metadata(variable, "value")
+
+
+def test_modified_label_matches_reference(tmp_path):
+    write_modified_label_product(str(tmp_path))
+    assert_same_product("modified_label", str(tmp_path))
+
+
+def test_label_does_not_depend_on_previous_products(tmp_path):
+    # The compiled template and the serialized fields are reused, the second product must not differ from the first
+    from easypds4writer.product_observational import ProductObservational
+    product = ProductObservational(VARIABLES_TEMPLATE)
+    t1, t2 = declare_tables(product)
+    for index in range(2):
+        product.new_product(str(tmp_path / ("variables_%d.tab" % index)))
+        product.set_metadata("$product_title", "Product with variables")
+        product.set_metadata("$start_time", "2020-01-01T00:00:00Z")
+        product.set_metadata("$stop_time", "2020-01-02T00:00:00Z")
+        for record in t1_records(3):
+            t1.add_record(record)
+        product.close_product()
+    for index in range(2):
+        assert read_label(str(tmp_path / ("variables_%d.xml" % index))).replace("variables_%d.tab" % index,
+                                                                                "variables.tab") == \
+            read_label(os.path.join(REFERENCE_DIRECTORY, "variables.xml"))
+
+
+def write_with(tmp_path, write_records, name, **options):
+    """Writes a product with the tables of declare_tables filled by write_records(t1, t2) and returns its data"""
+    from easypds4writer.product_observational import ProductObservational
+    product = ProductObservational(os.path.join(TEMPLATES_DIRECTORY, "minimal_test_template.xml"), **options)
+    t1, t2 = declare_tables(product)
+    data_file_name = str(tmp_path / (name + ".tab"))
+    product.new_product(data_file_name)
+    write_records(t1, t2)
+    product.close_product()
+    return read_data(data_file_name), read_label(str(tmp_path / (name + ".xml"))).replace(name + ".tab", "x.tab")
+
+
+def add_one_by_one(t1, t2):
+    for record in t1_records(1000):
+        t1.add_record(record)
+    for record in t2_records(100):
+        t2.add_record(record)
+
+
+def add_by_columns(t1, t2):
+    records = t1_records(1000)
+    t1.add_records([column for column in zip(*records)][:2] + [np.arange(-10, 990), np.arange(1000) * 1e5])
+    t2.add_records([[record[0] for record in t2_records(100)]])
+
+
+def add_arrays(t1, t2):
+    array = np.array(t1_records(1000), dtype=[("name", "U10"), ("val", "f8"), ("n", "i8"), ("e", "f8")])
+    t1.add_array(array[:400])
+    t1.add_array(array[400:])
+    t2.add_array(np.array(t2_records(100), dtype=[("k", "i4")]))
+
+
+def add_from_iterables(t1, t2):
+    t1.write_from((list(record) for record in t1_records(1000)), chunk_size=300)
+    t2.write_from(t2_records(100))
+
+
+@pytest.mark.parametrize("write_records", [add_by_columns, add_arrays, add_from_iterables])
+@pytest.mark.parametrize("options", [{}, {"binary": True}, {"binary": True, "write_queue_size": 2},
+                                     {"segmented_tables": True}, {"checksum": True}])
+def test_bulk_writers_match_add_record(tmp_path, write_records, options):
+    expected = write_with(tmp_path, add_one_by_one, "expected", **options)
+    assert write_with(tmp_path, write_records, "bulk", **options) == expected
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize("options", [{}, {"binary": True}])
+def test_bulk_writers_in_an_executor_match_add_record(tmp_path, process_pool, options):
+    def write_in_executor(t1, t2):
+        records = t1_records(1000)
+        t1.add_records([column for column in zip(*records[:500])], executor=process_pool, chunk_size=120)
+        t1.write_from(records[500:], chunk_size=120, executor=process_pool)
+        t2.write_from(t2_records(100), chunk_size=30, executor=process_pool)
+    assert write_with(tmp_path, write_in_executor, "executor", **options) == \
+        write_with(tmp_path, add_one_by_one, "expected", **options)
+
+
+@pytest.mark.parametrize("options", [{}, {"binary": True}])
+def test_bulk_writers_in_an_executor_report_the_field_too_wide(tmp_path, process_pool, options):
+    from easypds4writer.product_observational import ProductObservational
+    from easypds4writer.table_character import PDS4meInputError
+    product = ProductObservational(os.path.join(TEMPLATES_DIRECTORY, "minimal_test_template.xml"), **options)
+    t1, t2 = declare_tables(product)
+    product.new_product(str(tmp_path / "product.tab"))
+    records = t1_records(1000)
+    records[700] = ("a name too wide",) + records[700][1:]
+    # The chunk formatted by the executor has the wrong length, so it is formatted again to find the value
+    with pytest.raises(PDS4meInputError) as error_information:
+        t1.write_from(records, chunk_size=120, executor=process_pool)
+    assert "field name" in error_information.value.message
+    assert "a name too wide" in error_information.value.message
+    with pytest.raises(PDS4meInputError):
+        t1.add_records([column for column in zip(*records)], executor=process_pool, chunk_size=120)
+    product._discard_product()
+
+
+@pytest.mark.parametrize("write_records", [add_by_columns, add_arrays])
+def test_bulk_writers_match_add_record_in_many_blocks(tmp_path, monkeypatch, write_records):
+    import easypds4writer.table_character
+    monkeypatch.setattr(easypds4writer.table_character, "FORMAT_BLOCK_BYTES", 1000)
+    assert write_with(tmp_path, write_records, "bulk") == write_with(tmp_path, add_one_by_one, "expected")
+
+
+@pytest.mark.parametrize("to_column", [list, np.array])
+def test_bulk_writers_report_the_field_too_wide(to_column):
+    from easypds4writer.table_character import PDS4meInputError, TableCharacter
+    table = TableCharacter("t1")
+    table.declare_field("%-3s", "ASCII_String", "name", "none", "name")
+    table.declare_field("%4d", "ASCII_Integer", "n", "none", "count")
+    table.declare_field("%7.3f", "ASCII_Real", "val", "m", "value")
+    with pytest.raises(PDS4meInputError) as error_information:
+        # The records are checked before being written, so no data file is needed
+        table.add_records([to_column(["a", "b"]), to_column([1, 2]), to_column([1.0, 1000.0])])
+    assert "field val" in error_information.value.message
+
+
+@pytest.mark.parametrize("options", [{"binary": True}, {"binary": True, "write_queue_size": 2},
+                                     {"segmented_tables": True}])
+def test_data_file_modes_match_text_mode(tmp_path, options):
+    assert write_with(tmp_path, add_one_by_one, "mode", **options) == write_with(tmp_path, add_one_by_one, "text")
+
+
+def test_segmented_tables_can_be_written_in_any_order(tmp_path):
+    def interleave(t1, t2):
+        records = t2_records(100)
+        for index, record in enumerate(t1_records(1000)):
+            t1.add_record(record)
+            if index % 10 == 0:
+                t2.add_record(records[index // 10])
+    assert write_with(tmp_path, interleave, "segmented", segmented_tables=True) == \
+        write_with(tmp_path, add_one_by_one, "text")
+
+
+def test_segments_of_a_failed_product_are_discarded(tmp_path):
+    from easypds4writer.product_observational import ProductObservational
+    from easypds4writer.table_character import PDS4meInputError
+    product = ProductObservational(os.path.join(TEMPLATES_DIRECTORY, "minimal_test_template.xml"),
+                                   segmented_tables=True)
+    t1, t2 = declare_tables(product)
+    product.new_product(str(tmp_path / "failed.tab"))
+    t2.add_record((1,))
+    with pytest.raises(PDS4meInputError):
+        t1.add_record(("name too long", 1.0, 1, 1.0))
+    # The product is given up and a new one is written
+    product.new_product(str(tmp_path / "product.tab"))
+    add_one_by_one(t1, t2)
+    product.close_product()
+    assert read_data(str(tmp_path / "product.tab")) == write_with(tmp_path, add_one_by_one, "text")[0]
+
+
+def test_numpy_is_not_needed_to_write_products(tmp_path):
+    # NumPy is made unavailable in a new interpreter, which writes a product with add_record
+    code = "import sys; sys.modules['numpy'] = None\n" \
+           "from easypds4writer.product_observational import ProductObservational\n" \
+           "product = ProductObservational(sys.argv[1])\n" \
+           "table = product.declare_table_character('t2')\n" \
+           "table.declare_field('%5d', 'ASCII_Integer', 'k', 'none', 'k')\n" \
+           "product.new_product(sys.argv[2])\n" \
+           "table.add_record((1,))\n" \
+           "product.close_product()\n"
+    subprocess.run([sys.executable, "-c", code, os.path.join(TEMPLATES_DIRECTORY, "minimal_test_template.xml"),
+                    str(tmp_path / "product.tab")],
+                   check=True, env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(TEST_DIRECTORY))))
+    assert read_data(str(tmp_path / "product.tab")) == b"    1\r\n"
+
+if __name__ == "__main__":
+    sys.path.insert(0, sys.argv[1])
+    write_reference_products(sys.argv[2])
@@ -0,0 +1,112 @@
+"""Tests of RollingProductWriter splitting a stream of records into many products"""
+import os
+
+import pytest
+
+from easypds4writer.product_observational import ProductObservational
+from easypds4writer.product_reader import ProductReader
+from easypds4writer.rolling_product import RollingProductWriter, ShardInfo
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+VARIABLES_TEMPLATE = os.path.join(TEST_DIRECTORY, "reference", "variables_template.xml")
+
+# Records of (day, counter), each written as 11 bytes: "%3d, %4d" and CR LF
+RECORDS = [(day, counter) for day in range(3) for counter in range(day * 100, day * 100 + 7)]
+
+
+def make_product_type():
+    product = ProductObservational(VARIABLES_TEMPLATE)
+    table = product.declare_table_character("t1")
+    table.declare_field("%3d", "ASCII_Integer", "day", "none", "day")
+    table.declare_field("%4d", "ASCII_Integer", "counter", "none", "counter")
+    return product
+
+
+def set_metadata(shard):
+    return {"$product_title": "Shard %d" % shard.index, "$start_time": "2020-01-01T00:00:00Z",
+            "$stop_time": "2020-01-02T00:00:00Z"}
+
+
+def read_shards(writer):
+    # Records of each shard read back from its data file with the label
+    shard_records = []
+    for shard in writer.shards:
+        with ProductReader(os.path.splitext(shard.data_file_name)[0] + ".xml") as reader:
+            table = reader.table(0)
+            shard_records.append([table.record(index) for index in range(len(table))])
+    return shard_records
+
+
+def write_shards(tmp_path, write, **options):
+    writer = RollingProductWriter(make_product_type(), str(tmp_path / "shard_{shard:02d}.tab"),
+                                  metadata_callback=set_metadata, **options)
+    with writer:
+        write(writer)
+    return writer
+
+
+WRITERS = {"add_record": lambda writer: [writer.add_record(record) for record in RECORDS],
+           "add_records": lambda writer: writer.add_records([list(column) for column in zip(*RECORDS)]),
+           "write_from": lambda writer: writer.write_from(RECORDS)}
+
+
+@pytest.mark.parametrize("finalize_in_background", [True, False])
+@pytest.mark.parametrize("write", sorted(WRITERS))
+def test_shards_roll_over_on_max_records(tmp_path, write, finalize_in_background):
+    writer = write_shards(tmp_path, WRITERS[write], max_records=8, finalize_in_background=finalize_in_background)
+    assert read_shards(writer) == [RECORDS[:8], RECORDS[8:16], RECORDS[16:]]
+
+
+@pytest.mark.parametrize("write", sorted(WRITERS))
+def test_shards_roll_over_on_max_bytes(tmp_path, write):
+    # Four records of 11 bytes fit in 50 bytes
+    writer = write_shards(tmp_path, WRITERS[write], max_bytes=50)
+    assert read_shards(writer) == [RECORDS[first:first + 4] for first in range(0, len(RECORDS), 4)]
+    assert all(os.path.getsize(shard.data_file_name) <= 50 for shard in writer.shards)
+
+
+@pytest.mark.parametrize("write", sorted(WRITERS))
+def test_shards_roll_over_when_the_time_key_changes(tmp_path, write):
+    writer = RollingProductWriter(make_product_type(), str(tmp_path / "day_{key}_{shard}.tab"), max_records=5,
+                                  time_key=lambda record: record[0], metadata_callback=set_metadata)
+    with writer:
+        WRITERS[write](writer)
+    assert read_shards(writer) == [RECORDS[0:5], RECORDS[5:7], RECORDS[7:12], RECORDS[12:14], RECORDS[14:19],
+                                   RECORDS[19:21]]
+    assert [shard.key for shard in writer.shards] == [0, 0, 1, 1, 2, 2]
+    assert writer.shards[2].data_file_name == str(tmp_path / "day_1_2.tab")
+
+
+def test_shard_info_is_given_to_the_metadata_callback(tmp_path):
+    shards = []
+
+    def metadata_callback(shard):
+        shards.append(shard)
+        return set_metadata(shard)
+    writer = RollingProductWriter(make_product_type(), str(tmp_path / "shard_{shard:02d}.tab"), max_records=8,
+                                  metadata_callback=metadata_callback)
+    with writer:
+        writer.write_from(RECORDS)
+    assert shards == writer.shards == [
+        ShardInfo(0, str(tmp_path / "shard_00.tab"), None, 8, RECORDS[0], RECORDS[7]),
+        ShardInfo(1, str(tmp_path / "shard_01.tab"), None, 8, RECORDS[8], RECORDS[15]),
+        ShardInfo(2, str(tmp_path / "shard_02.tab"), None, 5, RECORDS[16], RECORDS[20])]
+    with open(str(tmp_path / "shard_01.xml")) as fp_label:
+        assert "<title>Shard 1</title>" in fp_label.read()
+
+
+def test_errors_writing_labels_in_the_background_are_raised_by_close(tmp_path, monkeypatch):
+    close_product = ProductObservational.close_product
+
+    def failing_close_product(product):
+        if product._data_file_name.endswith("shard_00.tab"):
+            raise OSError("disk full")
+        close_product(product)
+    monkeypatch.setattr(ProductObservational, "close_product", failing_close_product)
+    writer = RollingProductWriter(make_product_type(), str(tmp_path / "shard_{shard:02d}.tab"), max_records=8,
+                                  metadata_callback=set_metadata)
+    writer.write_from(RECORDS[:10])
+    with pytest.raises(OSError):
+        writer.close()
+    assert not os.path.exists(str(tmp_path / "shard_00.xml"))
+    assert os.path.exists(str(tmp_path / "shard_01.xml"))
@@ -0,0 +1,46 @@
+"""Tests of the fields inferred by TableCharacter.declare_fields_from"""
+import os
+
+import numpy as np
+
+from easypds4writer.product_observational import ProductObservational
+from easypds4writer.product_reader import ProductReader
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+
+def write_and_read_back(tmp_path, array):
+    """Writes array to a table with the fields inferred from it and returns the formats and the columns read back"""
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("inferred")
+    field_declarations = table.declare_fields_from(array)
+    product.new_product(str(tmp_path / "product.tab"))
+    table.add_array(array)
+    product.close_product()
+    with ProductReader(str(tmp_path / "product.xml")) as reader:
+        columns = [reader.table(0).column(name).tolist() for name in array.dtype.names]
+    return [field_declaration.field_format for field_declaration in field_declarations], columns
+
+
+def test_values_are_written_without_loss(tmp_path):
+    array = np.array([(1, -2.5, 0.125, "a", 1e-30), (-300, 1000.75, 3.0, "longer", 2.5e200)],
+                     dtype=[("i", "i4"), ("f", "f8"), ("g", "f4"), ("s", "U10"), ("e", "f8")])
+    formats, columns = write_and_read_back(tmp_path, array)
+    assert formats[:4] == ["%4d", "%8.2f", "%5.3f", "%-6s"]
+    assert columns == [array[name].tolist() for name in array.dtype.names]
+
+
+def test_whole_reals_get_one_decimal(tmp_path):
+    array = np.array([(1.0, 3), (2.0, 4), (-10.0, 5)], dtype=[("a", "f8"), ("b", "i4")])
+    formats, columns = write_and_read_back(tmp_path, array)
+    assert formats == ["%5.1f", "%1d"]
+    assert columns == [[1.0, 2.0, -10.0], [3, 4, 5]]
+
+
+def test_formats_of_a_dtype_fit_any_value():
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("inferred")
+    field_declarations = table.declare_fields_from(np.dtype([("u", "u1"), ("i", "i2"), ("f", "f8")]))
+    assert [field_declaration.field_format for field_declaration in field_declarations] == \
+        ["%3d", "%6d", "%24.16e"]
@@ -0,0 +1,89 @@
+"""Tests of the statistics collected while writing products with collect_stats or a stats_callback"""
+import os
+
+import numpy as np
+import pytest
+
+from easypds4writer.private.instrumentation import PHASES
+from easypds4writer.product_observational import ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+RECORDS = [("ab%d" % j, j * 1.5, j - 10) for j in range(1000)]
+
+
+def make_product(**options):
+    product = ProductObservational(TEMPLATE, **options)
+    t1 = product.declare_table_character("t1")
+    t1.declare_field("%-10s", "ASCII_String", "name", "none", "name")
+    t1.declare_field("%8.3f", "ASCII_Real", "value", "m", "value")
+    t1.declare_field("%+6d", "ASCII_Integer", "counter", "none", "counter")
+    t2 = product.declare_table_character("t2")
+    t2.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    return product, t1, t2
+
+
+def write_records(t1, t2):
+    for record in RECORDS[:100]:
+        t1.add_record(record)
+    t1.add_records(list(zip(*RECORDS[100:400])))
+    t1.add_array(np.array(RECORDS[400:700], dtype=[("name", "U10"), ("value", "f8"), ("counter", "i8")]))
+    t1.write_from(RECORDS[700:], chunk_size=64)
+    t2.write_from([(k,) for k in range(25)])
+
+
+@pytest.mark.parametrize("options", [{}, {"binary": True}, {"binary": True, "write_queue_size": 2},
+                                     {"segmented_tables": True}, {"checksum": True}])
+def test_rows_and_bytes_match_the_data_file(tmp_path, options):
+    collected_stats = []
+    product, t1, t2 = make_product(stats_callback=collected_stats.append, **options)
+    data_file_name = str(tmp_path / "product.tab")
+    product.new_product(data_file_name)
+    write_records(t1, t2)
+    product.close_product()
+
+    assert collected_stats == [product.stats]
+    stats = collected_stats[0]
+    assert stats.data_file_name == data_file_name
+    assert [(table.name, table.rows) for table in stats.tables] == [("t1", len(RECORDS)), ("t2", 25)]
+    assert [table.bytes for table in stats.tables] == [len(RECORDS) * 30, 25 * 7]
+    assert stats.rows == len(RECORDS) + 25
+    assert stats.bytes == os.path.getsize(data_file_name)
+    assert stats.label_bytes == os.path.getsize(str(tmp_path / "product.xml"))
+
+
+def test_every_phase_is_timed(tmp_path):
+    product, t1, t2 = make_product(collect_stats=True, segmented_tables=True)
+    product.new_product(str(tmp_path / "product.tab"))
+    write_records(t1, t2)
+    product.close_product()
+
+    stats = product.stats
+    assert tuple(stats.phase_times) == PHASES
+    # Every phase happens in segmented mode, so every phase took some time
+    assert all(phase_time > 0 for phase_time in stats.phase_times.values())
+    assert stats.label_time == sum(stats.phase_times[phase] for phase in ("label", "metadata", "label_write"))
+    assert all(table.format_time > 0 and table.write_time > 0 for table in stats.tables)
+    stats_dictionary = stats.as_dict()
+    assert set(stats_dictionary["phase_times"]) == set(PHASES)
+    assert [table["rows"] for table in stats_dictionary["tables"]] == [len(RECORDS), 25]
+
+
+def test_each_product_has_its_own_stats(tmp_path):
+    collected_stats = []
+    product, t1, t2 = make_product(stats_callback=collected_stats.append)
+    for index in range(2):
+        product.new_product(str(tmp_path / ("product_%d.tab" % index)))
+        t2.write_from([(k,) for k in range(index + 1)])
+        product.close_product()
+    assert [stats.rows for stats in collected_stats] == [1, 2]
+    assert collected_stats[0] is not collected_stats[1]
+
+
+def test_no_stats_are_collected_by_default(tmp_path):
+    product, t1, t2 = make_product()
+    product.new_product(str(tmp_path / "product.tab"))
+    write_records(t1, t2)
+    product.close_product()
+    assert product.stats is None
@@ -0,0 +1,78 @@
+"""Tests of the cache of parsed label templates shared by the products of the process"""
+import os
+import shutil
+
+import pytest
+
+from easypds4writer.private import template_cache
+from easypds4writer.product_observational import ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    template_cache.clear()
+    yield
+    template_cache.clear()
+
+
+def copy_template(directory, name):
+    template_name = os.path.join(directory, name)
+    shutil.copy(TEMPLATE, template_name)
+    return template_name
+
+
+def modify_template(template_name, title):
+    with open(template_name, encoding="utf-8-sig") as fp_template:
+        template = fp_template.read()
+    with open(template_name, "w", encoding="utf-8") as fp_template:
+        fp_template.write(template.replace("<title>PSA test product</title>", "<title>%s</title>" % title))
+    # The modification time must change even on file systems with a coarse resolution
+    modification_time = os.stat(template_name).st_mtime_ns + 10 ** 9
+    os.utime(template_name, ns=(modification_time, modification_time))
+
+
+def write_title(product, data_file_name):
+    # Writes a product and returns the title of its label
+    product.new_product(data_file_name)
+    product.close_product()
+    with open(os.path.splitext(data_file_name)[0] + ".xml") as fp_label:
+        label = fp_label.read()
+    return label[label.index("<title>") + len("<title>"):label.index("</title>")]
+
+
+@pytest.mark.parametrize("reload_template, second_title", [(True, "Modified"), (False, "PSA test product")])
+def test_modified_template_is_parsed_again_if_requested(tmp_path, reload_template, second_title):
+    template_name = copy_template(str(tmp_path), "template.xml")
+    product = ProductObservational(template_name, reload_template=reload_template)
+    product.declare_table_character("t1").declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    assert write_title(product, str(tmp_path / "first.tab")) == "PSA test product"
+    modify_template(template_name, "Modified")
+    assert write_title(product, str(tmp_path / "second.tab")) == second_title
+
+
+def test_products_share_the_parsed_template(tmp_path):
+    template_name = copy_template(str(tmp_path), "template.xml")
+    template = template_cache.get_template(template_name)
+    assert template_cache.get_template(os.path.relpath(template_name)) is template
+    modify_template(template_name, "Modified")
+    modified_template = template_cache.get_template(template_name)
+    assert modified_template is not template
+    # The older version of the template is not kept
+    assert list(template_cache._cached_templates.values()) == [modified_template]
+
+
+def test_least_recently_used_templates_are_discarded(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_cache, "MAX_CACHED_TEMPLATES", 2)
+    first, second, third = (copy_template(str(tmp_path), "template_%d.xml" % index) for index in range(3))
+    first_template = template_cache.get_template(first)
+    second_template = template_cache.get_template(second)
+    # Using the first template again makes the second one the least recently used
+    assert template_cache.get_template(first) is first_template
+    third_template = template_cache.get_template(third)
+    assert len(template_cache._cached_templates) == 2
+    assert template_cache.get_template(first) is first_template
+    assert template_cache.get_template(third) is third_template
+    assert template_cache.get_template(second) is not second_template
@@ -0,0 +1,119 @@
+"""Tests of the validation of blocks of records given column by column (TableCharacter.validate)"""
+import math
+import os
+
+import numpy as np
+import pytest
+
+from easypds4writer.product_observational import ProductObservational
+from easypds4writer.private.validation import validate_columns, validate_record
+from easypds4writer.table_character import PDS4meValidationError, TableCharacter
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_table():
+    table = TableCharacter("validated")
+    table.declare_field("%-5s", "ASCII_String", "name", "none", "name")
+    table.declare_field("%7.3f", "ASCII_Real", "value", "m", "value")
+    table.declare_field("%+4d", "ASCII_Integer", "counter", "none", "counter")
+    table.declare_field("%3d", "ASCII_NonNegative_Integer", "index", "none", "index")
+    table.declare_field("%9.2e", "ASCII_Real", "exponential", "none", "exponential")
+    return table
+
+
+def violations(table, columns):
+    with pytest.raises(PDS4meValidationError) as error_information:
+        table.validate(columns)
+    return [(violation.row, violation.field) for violation in error_information.value.violations]
+
+
+def test_valid_columns_pass():
+    table = make_table()
+    table.validate([["a", "abcde"], [1.5, -99.999], [999, -999], [0, 999], [1e300, 1e-300]])
+    table.validate([np.array(["a", "abcde"]), np.array([1.5, -99.999]), np.array([999, -999], dtype=np.int16),
+                    np.array([0, 999], dtype=np.uint16), np.array([1e300, 1e-300])])
+
+
+def test_every_problem_is_reported():
+    table = make_table()
+    columns = [["abcdef", "a", "b"], [1000.0, math.nan, 1.0], [1000, 1, -1000], [-1, 1000, 1], [1.0, math.inf, -1e100]]
+    assert violations(table, columns) == [(0, "name"), (0, "value"), (1, "value"), (0, "counter"),
+                                          (2, "counter"), (0, "index"), (1, "index"), (1, "exponential"),
+                                          (2, "exponential")]
+
+
+def test_widths_close_to_the_limit_are_formatted():
+    table = make_table()
+    # 99.9996 is rounded to 100.000, which fits, and -99.9996 to -100.000, which does not
+    assert violations(table, [["a", "b"], [99.9996, -99.9996], [0, 0], [0, 0], [0.0, 0.0]]) == [(1, "value")]
+
+
+def test_types_are_checked():
+    table = make_table()
+    assert violations(table, [["a"], ["1.0"], [1.5], [0], [0.0]]) == [(None, "value"), (0, "counter")]
+
+
+def test_numbers_of_columns_and_values_are_checked():
+    table = make_table()
+    assert violations(table, [["a"], [1.0]]) == [(None, None)]
+    assert violations(table, [["a"], [1.0, 2.0], [1], [1], [1.0]]) == [(None, "value")]
+
+
+def test_data_type_must_agree_with_field_format():
+    table = TableCharacter("mismatch")
+    table.declare_field("%5.2f", "ASCII_Integer", "counter", "none", "counter")
+    assert violations(table, [[1]]) == [(None, "counter")]
+
+
+@pytest.mark.parametrize("record", [("a", 1.5, 999, 0, 1e300), ("abcdef", 1000.0, 1000, -1, math.inf),
+                                    ("a", math.nan, 1.5, 1000, -1e100), ("a", 99.9996, True, 999, 0.0),
+                                    ("a", -99.9996, -1000, 0, 1e-300), (1, "1.0", 0, 0, 0.0), ("a", 1.0),
+                                    ("a", np.float64(1.5), np.int16(999), np.uint16(0), np.float64(1.0))])
+def test_single_records_are_validated_as_blocks(record):
+    table = make_table()
+    compiled_format = table._record_character.compiled_format()
+    # Only the messages about the number of values differ
+    assert [violation[:2] for violation in validate_record(compiled_format.field_checks(), record)] == \
+        [violation[:2] for violation in validate_columns(compiled_format, [[value] for value in record])]
+
+
+def test_integers_out_of_the_range_of_numpy_are_validated():
+    table = TableCharacter("large")
+    table.declare_field("%25d", "ASCII_Integer", "large", "none", "large")
+    table.declare_field("%9.2e", "ASCII_Real", "exponential", "none", "exponential")
+    table.validate([[2 ** 70, -2 ** 70], [2 ** 70, 1]])
+    assert violations(table, [[10 ** 30, 1], [1, 10 ** 400]]) == [(0, "large"), (1, "exponential")]
+
+
+def test_floats_are_not_valid_hexadecimal_integers():
+    table = TableCharacter("hexadecimal")
+    table.declare_field("%4x", "ASCII_Integer", "hexadecimal", "none", "hexadecimal")
+    table.validate([[255, -15]])
+    assert violations(table, [[255.0]]) == [(None, "hexadecimal")]
+
+
+def write_nan(tmp_path, validate_records, write):
+    product = ProductObservational(os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml"))
+    table = product.declare_table_character("t1")
+    table.declare_field("%7.3f", "ASCII_Real", "value", "m", "value")
+    table.validate_records = validate_records
+    product.new_product(str(tmp_path / "product.tab"))
+    write(table, [(1.0,), (math.nan,)])
+    product.close_product()
+    with open(str(tmp_path / "product.tab"), "rb") as fp_data:
+        return fp_data.read()
+
+
+WRITERS = {"add_record": lambda table, records: [table.add_record(record) for record in records],
+           "add_records": lambda table, records: table.add_records(list(zip(*records))),
+           "add_array": lambda table, records: table.add_array(np.array(records, dtype=[("value", "f8")])),
+           "write_from": lambda table, records: table.write_from(records)}
+
+
+@pytest.mark.parametrize("writer", sorted(WRITERS))
+def test_all_writers_follow_the_same_nan_policy(tmp_path, writer):
+    # Without validation only widths are checked, so every writer writes NaN as the formatter does
+    assert write_nan(tmp_path, False, WRITERS[writer]) == b"  1.000\r\n    nan\r\n"
+    with pytest.raises(PDS4meValidationError):
+        write_nan(tmp_path, True, WRITERS[writer])
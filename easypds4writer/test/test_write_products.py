@@ -0,0 +1,46 @@
+"""Tests of ProductObservational.write_products writing products in a pool of processes"""
+import os
+
+from easypds4writer.product_observational import ProductJob, ProductObservational
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE = os.path.join(TEST_DIRECTORY, "example_templates", "minimal_test_template.xml")
+
+
+def make_product():
+    product = ProductObservational(TEMPLATE)
+    table = product.declare_table_character("t1")
+    table.declare_field("%5d", "ASCII_Integer", "k", "none", "k")
+    return product
+
+
+def three_records():
+    return [(1,), (2,), (3,)]
+
+
+def read_data(data_file_name):
+    with open(data_file_name, "rb") as fp_data:
+        return fp_data.read()
+
+
+def test_products_are_written(tmp_path):
+    jobs = [ProductJob(str(tmp_path / "list.tab"), {}, [[(1,), (2,), (3,)]]),
+            (str(tmp_path / "callable.tab"), {}, [three_records])]
+    results = make_product().write_products(jobs, workers=2)
+    assert [result.error for result in results] == [None, None]
+    assert [result.label_file_name for result in results] == [str(tmp_path / "list.xml"),
+                                                              str(tmp_path / "callable.xml")]
+    assert read_data(str(tmp_path / "list.tab")) == read_data(str(tmp_path / "callable.tab")) == \
+        b"    1\r\n    2\r\n    3\r\n"
+
+
+def test_errors_do_not_stop_the_other_products(tmp_path):
+    jobs = [ProductJob(str(tmp_path / "first.tab"), {}, [three_records]),
+            ProductJob(str(tmp_path / "generator.tab"), {}, [((k,) for k in range(3))]),
+            ProductJob(str(tmp_path / "too_wide.tab"), {}, [[(123456,)]]),
+            ProductJob(str(tmp_path / "last.tab"), {}, [three_records])]
+    results = make_product().write_products(jobs, workers=2)
+    assert [result.data_file_name for result in results] == [job.data_file_name for job in jobs]
+    assert [result.error is None for result in results] == [True, False, False, True]
+    assert isinstance(results[1].error, TypeError)
+    assert os.path.exists(str(tmp_path / "last.xml"))